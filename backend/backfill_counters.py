@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Backfill the message counters on ``conversations``.
+
+Sets ``total_messages``, ``user_messages``, ``ai_messages`` and
+``last_message_at`` from the ``messages`` table for every conversation, in
+batches of conversation ids so no single transaction holds many row locks.
+Each batch is one UPDATE with correlated counts, so messages added while the
+job runs are still counted exactly once. Safe to re-run.
+
+    python backfill_counters.py --batch-size 1000
+"""
+
+import argparse
+import logging
+import time
+
+from sqlalchemy import false, func, select, true, update
+
+from database import engine
+from models import Conversation, Message
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def backfill_counters(target_engine=None, batch_size: int = 1000) -> int:
+    """Recompute the counters of every conversation; returns the number updated"""
+    target_engine = target_engine or engine
+    conversations = Conversation.__table__
+    messages = Message.__table__
+
+    def count(*criteria):
+        return select(func.count()).where(
+            messages.c.conversation_id == conversations.c.id, *criteria
+        ).scalar_subquery()
+
+    values = {
+        "total_messages": count(),
+        "user_messages": count(messages.c.is_user_message == true()),
+        "ai_messages": count(messages.c.is_user_message == false()),
+        "last_message_at": select(func.max(messages.c.created_at)).where(
+            messages.c.conversation_id == conversations.c.id
+        ).scalar_subquery(),
+        # Keep each conversation's place in the list
+        "updated_at": conversations.c.updated_at,
+    }
+
+    updated = 0
+    last_id = ""
+    started = time.perf_counter()
+    while True:
+        with target_engine.begin() as conn:
+            ids = conn.execute(
+                select(conversations.c.id).where(conversations.c.id > last_id)
+                .order_by(conversations.c.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(update(conversations).where(conversations.c.id.in_(ids)).values(**values))
+        updated += len(ids)
+        last_id = ids[-1]
+        logger.info(f"Backfilled {updated} conversations")
+
+    logger.info(f"Backfilled counters for {updated} conversations in {time.perf_counter() - started:.2f}s")
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill conversation message counters")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Conversations updated per transaction")
+    args = parser.parse_args(argv)
+    backfill_counters(batch_size=args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,144 +1,339 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User, Conversation, Message
-from typing import List, Dict, Optional
+from history_cache import history_cache
+from write_behind import write_queue, write_turns, merge_counter_deltas
+from typing import List, Dict, Optional, Tuple
 import uuid
+import time
+import random
+import base64
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+_last_id_timestamp = 0
+
+def new_message_id() -> str:
+    """UUIDv7-style id (48-bit Unix milliseconds plus 12 bits of sub-millisecond time).
+    
+    ``created_at`` only has one-second resolution, so history queries order by
+    ``(created_at, id)`` and rely on the id to order messages from the same second.
+    """
+    global _last_id_timestamp
+    # Strictly increasing within the process, even if the clock repeats a value
+    timestamp = max(time.time_ns() * 4096 // 1_000_000, _last_id_timestamp + 1)
+    _last_id_timestamp = timestamp
+    millis, fraction = divmod(timestamp, 4096)
+    value = (millis << 80) | (0x7 << 76) | (fraction << 64) | (0b10 << 62) | random.getrandbits(62)
+    return str(uuid.UUID(int=value))
+
+def _now() -> datetime:
+    # Timestamps are set here rather than by the database so new rows need no
+    # refresh; DATETIME columns keep whole seconds
+    return datetime.now().replace(microsecond=0)
+
+def encode_cursor(message: Message) -> str:
+    """Opaque paging cursor for a message's position in its conversation"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """``(created_at, id)`` from a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
 class ConversationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, autocommit: bool = True):
+        """``autocommit=False`` stages every write until ``commit()``, so a chat
+        turn (user, conversation, both messages and the counter updates) is
+        written as one unit of work.
+        """
         self.db = db
+        self.autocommit = autocommit
+        # Staged, not yet written: new rows, counter increments per conversation
+        # and the history-buffer appends to apply once they are committed
+        self._pending: list = []
+        self._counter_deltas: Dict[str, Dict] = {}
+        self._history_appends: List[Tuple[str, Dict]] = []
+    
+    async def commit(self):
+        """Write everything staged since the last commit.
+        
+        With ``CHAT_WRITE_MODE`` set to ``group`` or ``async`` the writes go
+        through the group-commit queue instead of this session.
+        """
+        pending, deltas, appends = self._pending, self._counter_deltas, self._history_appends
+        self._pending, self._counter_deltas, self._history_appends = [], {}, []
+        if write_queue.enabled:
+            for obj in pending:
+                self.db.expunge(obj)
+            # End this session's read transaction so its connection goes back to
+            # the pool for the writer instead of being held while we wait
+            await self.db.commit()
+            # New users and conversations must be visible to the next request
+            await write_queue.submit(pending, deltas, wait=any(not isinstance(obj, Message) for obj in pending))
+        else:
+            await write_turns(self.db, [(pending, deltas)])
+        # Write through to the recent-history buffers
+        for conversation_id, entry in appends:
+            history_cache.append(conversation_id, entry)
+    
+    async def _stage(self, obj):
+        self.db.add(obj)
+        self._pending.append(obj)
+        if self.autocommit:
+            await self.commit()
     
-    def create_user(self, email: str, first_name: str = "Anonymous", last_name: str = "User") -> User:
+    async def create_user(self, email: str, first_name: str = "Anonymous", last_name: str = "User") -> User:
         """Create a new user or get existing user"""
-        user = self.db.query(User).filter(User.email == email).first()
+        result = await self.db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
         if not user:
             user = User(
                 id=str(uuid.uuid4()),
                 email=email,
                 first_name=first_name,
-                last_name=last_name
+                last_name=last_name,
+                created_at=_now()
             )
-            self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
+            await self._stage(user)
             logger.info(f"Created new user: {user.id}")
         return user
     
-    def create_conversation(self, user_id: str, title: str = None) -> Conversation:
+    async def create_conversation(self, user_id: str, title: str = None) -> Conversation:
         """Create a new conversation for a user"""
+        now = _now()
         conversation = Conversation(
             id=str(uuid.uuid4()),
             user_id=user_id,
-            title=title or f"Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+            title=title or f"Conversation {now.strftime('%Y-%m-%d %H:%M')}",
+            created_at=now,
+            updated_at=now
         )
-        self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
+        await self._stage(conversation)
+        # A new conversation's history is known to be empty
+        history_cache.fill(conversation.id, [])
         logger.info(f"Created new conversation: {conversation.id}")
         return conversation
     
-    def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+    async def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
         """Get conversation by ID"""
-        return self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        result = await self.db.execute(select(Conversation).filter(Conversation.id == conversation_id))
+        return result.scalars().first()
     
-    def get_user_conversations(self, user_id: str) -> List[Conversation]:
+    async def get_user_conversations(self, user_id: str) -> List[Conversation]:
         """Get all conversations for a user"""
-        return self.db.query(Conversation).filter(
+        result = await self.db.execute(select(Conversation).filter(
             Conversation.user_id == user_id,
             Conversation.is_active == True
-        ).order_by(Conversation.updated_at.desc()).all()
+        ).order_by(Conversation.updated_at.desc()))
+        return list(result.scalars().all())
     
-    def add_message(self, conversation_id: str, content: str, is_user_message: bool, message_metadata: Dict = None) -> Message:
+    async def get_user_conversations_by_email(self, email: str) -> List[Conversation]:
+        """Active conversations of the user with ``email``, newest first, in one query.
+        
+        Uses the unique email index and then the (user_id, is_active, updated_at)
+        index; message counts come from the conversation's counters.
+        """
+        result = await self.db.execute(select(Conversation).join(
+            User, User.id == Conversation.user_id
+        ).filter(
+            User.email == email,
+            Conversation.is_active == True
+        ).order_by(Conversation.updated_at.desc()))
+        return list(result.scalars().all())
+    
+    async def add_message(self, conversation_id: str, content: str, is_user_message: bool, message_metadata: Dict = None) -> Message:
         """Add a message to a conversation"""
         message = Message(
-            id=str(uuid.uuid4()),
+            id=new_message_id(),
             conversation_id=conversation_id,
             content=content,
             is_user_message=is_user_message,
-            message_metadata=message_metadata or {}
+            message_metadata=message_metadata or {},
+            created_at=_now()
         )
-        self.db.add(message)
-        
-        # Update conversation timestamp
-        conversation = self.get_conversation(conversation_id)
-        if conversation:
-            conversation.updated_at = datetime.now()
-        
-        self.db.commit()
-        self.db.refresh(message)
+        # Counters are incremented in the database on commit, so concurrent
+        # turns cannot lose an increment
+        merge_counter_deltas(self._counter_deltas, {conversation_id: {
+            "total": 1,
+            "user": 1 if is_user_message else 0,
+            "ai": 0 if is_user_message else 1,
+            "last_message_at": message.created_at
+        }})
+        self._history_appends.append((conversation_id, self._history_entry(message)))
+        await self._stage(message)
         logger.info(f"Added message to conversation {conversation_id}")
         return message
     
-    def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Message]:
+    async def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Message]:
         """Get messages for a conversation"""
-        return self.db.query(Message).filter(
+        result = await self.db.execute(select(Message).filter(
+            Message.conversation_id == conversation_id
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(limit))
+        return list(result.scalars().all())
+    
+    async def get_messages_page(self, conversation_id: str, limit: int = 50, before: Optional[str] = None,
+                                after: Optional[str] = None) -> Tuple[List[Message], bool]:
+        """One page of messages, oldest first, and whether more exist in the paging direction.
+        
+        Without a cursor this is the latest page; ``before`` pages towards
+        older messages and ``after`` towards newer ones. Pages are keyset
+        ranges over ``(created_at, id)`` on the (conversation_id, created_at, id)
+        index, so every page costs the same however far back it is.
+        """
+        query = select(Message).filter(Message.conversation_id == conversation_id)
+        if after:
+            created_at, message_id = decode_cursor(after)
+            query = query.filter(or_(
+                Message.created_at > created_at,
+                and_(Message.created_at == created_at, Message.id > message_id)
+            )).order_by(Message.created_at.asc(), Message.id.asc())
+        else:
+            if before:
+                created_at, message_id = decode_cursor(before)
+                query = query.filter(or_(
+                    Message.created_at < created_at,
+                    and_(Message.created_at == created_at, Message.id < message_id)
+                ))
+            query = query.order_by(Message.created_at.desc(), Message.id.desc())
+        
+        # One extra row tells whether there is another page
+        result = await self.db.execute(query.limit(limit + 1))
+        messages = list(result.scalars().all())
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not after:
+            messages.reverse()
+        return messages, has_more
+    
+    async def get_conversation_history(self, conversation_id: str, limit: int = 10) -> List[Dict]:
+        """Get the latest ``limit`` messages, oldest first, as dicts for LLM context.
+        
+        Served from the recent-history buffer when possible; otherwise the
+        latest messages are queried and buffered for the following turns.
+        """
+        history = history_cache.get(conversation_id, limit)
+        if history is not None:
+            return history
+        
+        fetch = max(limit, history_cache.max_messages)
+        result = await self.db.execute(select(Message).filter(
             Message.conversation_id == conversation_id
-        ).order_by(Message.created_at.desc()).limit(limit).all()
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(fetch))
+        history = [self._history_entry(msg) for msg in reversed(result.scalars().all())]
+        if fetch == history_cache.max_messages:
+            history_cache.fill(conversation_id, history)
+        return history[-limit:] if limit else []
+    
+    @staticmethod
+    def _history_entry(msg: Message) -> Dict:
+        return {
+            "content": msg.content,
+            "is_user_message": msg.is_user_message,
+            "created_at": msg.created_at.isoformat() if msg.created_at else None,
+            "metadata": msg.message_metadata
+        }
     
-    def get_conversation_history(self, conversation_id: str, limit: int = 10) -> List[Dict]:
-        """Get conversation history as list of dicts for LLM context"""
-        messages = self.db.query(Message).filter(
+    async def get_messages_to_summarize(self, conversation_id: str, keep_recent: int, min_messages: int = 1,
+                                        limit: int = 50) -> Tuple[Optional[Conversation], List[Dict]]:
+        """Messages not yet folded into the rolling summary, excluding the latest ``keep_recent``.
+        
+        Returns no messages until at least ``min_messages`` of them are due,
+        so the summary is updated in batches rather than on every turn.
+        """
+        conversation = await self.get_conversation(conversation_id)
+        if not conversation:
+            return None, []
+        
+        result = await self.db.execute(select(Message).filter(
             Message.conversation_id == conversation_id
-        ).order_by(Message.created_at.asc()).limit(limit).all()
+        ).order_by(Message.created_at.asc(), Message.id.asc()).offset(
+            conversation.summary_message_count or 0
+        ).limit(limit + keep_recent))
+        messages = result.scalars().all()
+        due = messages[:max(len(messages) - keep_recent, 0)]
+        if len(due) < min_messages:
+            return conversation, []
+        return conversation, [self._history_entry(msg) for msg in due]
+    
+    async def save_summary(self, conversation_id: str, summary: str, summarized: int, folded: int) -> bool:
+        """Store a new rolling summary covering ``folded`` more messages.
         
-        return [
-            {
-                "content": msg.content,
-                "is_user_message": msg.is_user_message,
-                "created_at": msg.created_at.isoformat() if msg.created_at else None,
-                "metadata": msg.message_metadata
-            }
-            for msg in messages
-        ]
-    
-    def update_conversation_title(self, conversation_id: str, title: str) -> bool:
+        The update only applies if nobody else moved the summary on since it
+        was read (``summarized`` messages covered), so concurrent updates
+        cannot fold the same messages twice.
+        """
+        result = await self.db.execute(update(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.summary_message_count == summarized
+        ).values(
+            summary=summary,
+            summary_message_count=summarized + folded,
+            # Summaries are bookkeeping; keep the conversation's place in the list
+            updated_at=Conversation.updated_at
+        ))
+        await self.db.commit()
+        return result.rowcount == 1
+    
+    async def update_conversation_title(self, conversation_id: str, title: str) -> bool:
         """Update conversation title"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = await self.get_conversation(conversation_id)
         if conversation:
             conversation.title = title
-            self.db.commit()
+            await self.db.commit()
             return True
         return False
     
-    def deactivate_conversation(self, conversation_id: str) -> bool:
+    async def deactivate_conversation(self, conversation_id: str) -> bool:
         """Deactivate a conversation"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = await self.get_conversation(conversation_id)
         if conversation:
             conversation.is_active = False
-            self.db.commit()
+            await self.db.commit()
             return True
         return False
     
-    def get_or_create_conversation(self, user_id: str, conversation_id: str = None) -> Conversation:
+    async def update_message_metadata(self, message_id: str, updates: Dict) -> bool:
+        """Merge ``updates`` into a message's metadata"""
+        message = await self.db.get(Message, message_id)
+        if message:
+            # Assign a new dict so the JSON column change is detected
+            message.message_metadata = {**(message.message_metadata or {}), **updates}
+            await self.db.commit()
+            return True
+        return False
+    
+    async def get_or_create_conversation(self, user_id: str, conversation_id: str = None) -> Conversation:
         """Get existing conversation or create new one"""
         if conversation_id:
-            conversation = self.get_conversation(conversation_id)
+            conversation = await self.get_conversation(conversation_id)
             if conversation and conversation.user_id == user_id:
                 return conversation
         
         # Create new conversation
-        return self.create_conversation(user_id)
+        return await self.create_conversation(user_id)
     
-    def get_conversation_summary(self, conversation_id: str) -> Dict:
+    async def get_conversation_summary(self, conversation_id: str) -> Dict:
         """Get summary of a conversation"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = await self.get_conversation(conversation_id)
         if not conversation:
             return {}
         
-        messages = self.get_conversation_messages(conversation_id)
-        user_messages = [msg for msg in messages if msg.is_user_message]
-        ai_messages = [msg for msg in messages if not msg.is_user_message]
-        
         return {
             "conversation_id": conversation.id,
             "title": conversation.title,
             "created_at": conversation.created_at.isoformat() if conversation.created_at else None,
             "updated_at": conversation.updated_at.isoformat() if conversation.updated_at else None,
-            "total_messages": len(messages),
-            "user_messages": len(user_messages),
-            "ai_messages": len(ai_messages),
+            "total_messages": conversation.total_messages,
+            "user_messages": conversation.user_messages,
+            "ai_messages": conversation.ai_messages,
+            "last_message_at": conversation.last_message_at.isoformat() if conversation.last_message_at else None,
             "is_active": conversation.is_active
-        } 
\ No newline at end of file
+        }
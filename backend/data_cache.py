@@ -0,0 +1,246 @@
+"""
+Read-through cache for the data lookups behind chat answers.
+
+Top products, order status and inventory totals only change when
+``load_data.py`` writes, so ``LLMService`` serves them from this cache instead
+of querying the database on every message:
+
+- every intent has its own TTL and LRU size bound
+- concurrent misses for the same key are coalesced (single-flight): the first
+  caller runs the query and the others await its result
+- ``get_many`` loads every missing key of a batch with one query
+- the loader bumps a version stamp in the ``data_versions`` table in the same
+  transaction as its writes; the API polls the stamp at most every
+  ``DATA_VERSION_CHECK_SECONDS`` and drops every cached lookup when it changes
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# Name of the version stamp row for the e-commerce dataset
+DATASET = "dataset"
+
+# Seconds a lookup stays cached, and how many lookups are kept, per intent
+DEFAULT_TTLS = {
+    "top_products": 600,
+    "order_status": 60,
+    "inventory": 120,
+}
+DEFAULT_SIZES = {
+    "top_products": 16,
+    "order_status": 10000,
+    "inventory": 2000,
+}
+
+def bump_data_version(conn: Connection, name: str = DATASET) -> None:
+    """Mark the dataset as changed; call inside the transaction that wrote the data"""
+    table = DataVersion.__table__
+    result = conn.execute(update(table).where(table.c.name == name).values(
+        version=table.c.version + 1, updated_at=datetime.now()))
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(name=name, version=1, updated_at=datetime.now()))
+
+class DataCache:
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, sizes: Optional[Dict[str, int]] = None,
+                 check_interval: float = 5.0, enabled: bool = True):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.sizes = dict(DEFAULT_SIZES if sizes is None else sizes)
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._entries: Dict[str, "OrderedDict[Hashable, tuple]"] = {intent: OrderedDict() for intent in self.ttls}
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # Bumped on every invalidation so loads started before it are not stored
+        self._generation = 0
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self.counters = {intent: {"hits": 0, "misses": 0, "coalesced": 0} for intent in self.ttls}
+        self.invalidations = 0
+
+    async def get_or_load(self, intent: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for ``(intent, key)``, running ``loader`` once on a miss.
+
+        Cached values are shared between callers and must not be mutated.
+        """
+        if not self.enabled or intent not in self.ttls:
+            return await loader()
+
+        entries = self._entries[intent]
+        counters = self.counters[intent]
+        entry = entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                entries.move_to_end(key)
+                counters["hits"] += 1
+                return value
+            del entries[key]
+
+        flight_key = (intent, key)
+        pending = self._inflight.get(flight_key)
+        if pending is not None:
+            counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request running the query was cancelled; query for ourselves
+                return await loader()
+
+        counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+        future.set_result(value)
+        if generation == self._generation:
+            self._store(intent, key, value)
+        return value
+
+    async def get_many(self, intent: str, keys: List[Hashable],
+                       loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Cached values for each of ``keys``, loading all misses with one ``loader(missing)`` call.
+
+        ``loader`` returns a dict; keys it leaves out are cached as None. Keys
+        another caller is already loading are awaited rather than loaded again.
+        """
+        if not self.enabled or intent not in self.ttls:
+            loaded = await loader(list(keys))
+            return {key: loaded.get(key) for key in keys}
+
+        entries = self._entries[intent]
+        counters = self.counters[intent]
+        now = time.monotonic()
+        values: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        missing: List[Hashable] = []
+        for key in dict.fromkeys(keys):
+            entry = entries.get(key)
+            if entry is not None and entry[1] > now:
+                entries.move_to_end(key)
+                counters["hits"] += 1
+                values[key] = entry[0]
+            elif (intent, key) in self._inflight:
+                counters["coalesced"] += 1
+                waiting[key] = self._inflight[(intent, key)]
+            else:
+                missing.append(key)
+
+        if missing:
+            counters["misses"] += len(missing)
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            for key, future in futures.items():
+                self._inflight[(intent, key)] = future
+            generation = self._generation
+            try:
+                loaded = await loader(missing)
+            except asyncio.CancelledError:
+                for future in futures.values():
+                    future.cancel()
+                raise
+            except Exception as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                    future.exception()
+                raise
+            finally:
+                for key in missing:
+                    self._inflight.pop((intent, key), None)
+            for key, future in futures.items():
+                values[key] = loaded.get(key)
+                future.set_result(values[key])
+                if generation == self._generation:
+                    self._store(intent, key, values[key])
+
+        for key, pending in waiting.items():
+            try:
+                values[key] = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request running the query was cancelled; query for ourselves
+                values[key] = (await loader([key])).get(key)
+        return values
+
+    def _store(self, intent: str, key: Hashable, value: Any) -> None:
+        entries = self._entries[intent]
+        entries[key] = (value, time.monotonic() + self.ttls[intent])
+        entries.move_to_end(key)
+        while len(entries) > self.sizes.get(intent, 0):
+            entries.popitem(last=False)
+
+    async def check_version(self, db: AsyncSession) -> bool:
+        """Poll the dataset version stamp; returns True when it changed and the cache was cleared"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        # Claim the check before awaiting so concurrent requests do not all poll
+        self._checked_at = now
+        result = await db.execute(select(DataVersion.version).where(DataVersion.name == DATASET))
+        version = result.scalar() or 0
+        if self.version is None:
+            self.version = version
+            return False
+        if version == self.version:
+            return False
+        logger.info(f"Dataset version changed {self.version} -> {version}; clearing data caches")
+        self.version = version
+        self.clear()
+        return True
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.invalidations += 1
+        for entries in self._entries.values():
+            entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        intents = {}
+        for intent, counters in self.counters.items():
+            lookups = counters["hits"] + counters["misses"] + counters["coalesced"]
+            intents[intent] = {
+                **counters,
+                "entries": len(self._entries[intent]),
+                "max_entries": self.sizes.get(intent, 0),
+                "ttl_seconds": self.ttls[intent],
+                "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+        return {
+            "enabled": self.enabled,
+            "data_version": self.version,
+            "invalidations": self.invalidations,
+            "intents": intents,
+        }
+
+data_cache = DataCache(
+    ttls={intent: float(os.getenv(f"DATA_CACHE_TTL_{intent.upper()}", ttl)) for intent, ttl in DEFAULT_TTLS.items()},
+    sizes={intent: int(os.getenv(f"DATA_CACHE_SIZE_{intent.upper()}", size)) for intent, size in DEFAULT_SIZES.items()},
+    check_interval=float(os.getenv("DATA_VERSION_CHECK_SECONDS", "5")),
+    enabled=os.getenv("DATA_CACHE_ENABLED", "true").lower() == "true",
+)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Verify that each hot query path is served by its index.
+
+Runs EXPLAIN (MySQL) or EXPLAIN QUERY PLAN (SQLite) for the queries issued on
+every chat turn, conversation listing and order/inventory lookup, and checks
+that the planner picks the expected index. Exits non-zero if any query does
+not. Run it against a database with data loaded: on empty tables MySQL may
+skip indexes because a full scan is free.
+
+    python explain_check.py
+"""
+
+import sys
+import logging
+
+from sqlalchemy import text
+
+from database import engine
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# (description, SQL, expected index)
+HOT_QUERIES = [
+    (
+        "chat history for a conversation",
+        "SELECT * FROM messages WHERE conversation_id = 'x' ORDER BY created_at DESC, id DESC LIMIT 10",
+        "ix_messages_conversation_id_created_at",
+    ),
+    (
+        "older page of message history (keyset cursor)",
+        "SELECT * FROM messages WHERE conversation_id = 'x' AND "
+        "(created_at < '2024-01-01 00:00:00' OR (created_at = '2024-01-01 00:00:00' AND id < 'x')) "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+        "ix_messages_conversation_id_created_at",
+    ),
+    (
+        "active conversations for a user",
+        "SELECT * FROM conversations WHERE user_id = 'x' AND is_active = 1 ORDER BY updated_at DESC",
+        "ix_conversations_user_id_is_active_updated_at",
+    ),
+    (
+        "inventory availability by product id",
+        "SELECT product_id, COUNT(*), SUM(CASE WHEN sold_at IS NULL THEN 1 ELSE 0 END) "
+        "FROM inventory_items WHERE product_id IN (1, 2, 3) GROUP BY product_id",
+        "ix_inventory_items_product_id_sold_at",
+    ),
+    (
+        "inventory availability by product name",
+        "SELECT COUNT(*) FROM inventory_items WHERE product_name = 'x' AND sold_at IS NULL",
+        "ix_inventory_items_product_name_sold_at",
+    ),
+    (
+        "order items of a product",
+        "SELECT * FROM order_items WHERE product_id = 1",
+        "ix_order_items_product_id",
+    ),
+    (
+        "top selling products",
+        "SELECT * FROM product_sales_rollup ORDER BY units_sold DESC LIMIT 5",
+        "ix_product_sales_rollup_units_sold",
+    ),
+]
+
+def used_indexes(conn, sql: str) -> str:
+    """The planner's index choice for ``sql`` as reported by EXPLAIN"""
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+        return " ".join(str(row.get("key")) for row in rows)
+    if dialect == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return " ".join(str(row[-1]) for row in rows)
+    raise ValueError(f"EXPLAIN check is not supported for the {dialect} dialect")
+
+def main() -> int:
+    failures = 0
+    with engine.connect() as conn:
+        for description, sql, expected in HOT_QUERIES:
+            plan = used_indexes(conn, sql)
+            if expected in plan:
+                logger.info(f"OK   {description}: {expected}")
+            else:
+                failures += 1
+                logger.error(f"FAIL {description}: expected {expected}, plan was: {plan}")
+    if failures:
+        logger.error(f"{failures} hot queries are not using their index")
+    else:
+        logger.info("All hot queries use their index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Recent-history ring buffers for active conversations.
+
+Each buffered conversation keeps its latest ``max_messages`` messages in a
+bounded deque, so building LLM context for a turn needs no database query.
+``ConversationService`` writes every new message through to the buffer once
+it is committed (or queued for write-behind); a conversation that is not
+buffered (or whose buffer expired) is filled from a "latest N" query on first
+use. The number of buffered conversations is LRU-bounded.
+
+Buffers are per process. The TTL bounds how long a buffer can miss messages
+written by another worker process for the same conversation.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+class HistoryCache:
+    def __init__(self, max_messages: int = 10, max_conversations: int = 5000, ttl: float = 300,
+                 enabled: bool = True):
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.enabled = enabled
+        # conversation id -> (deque of the latest messages, expiry time)
+        self._buffers: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, conversation_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Latest ``limit`` messages, oldest first, or None when the buffer cannot answer"""
+        if not self.enabled or limit > self.max_messages:
+            return None
+        entry = self._buffers.get(conversation_id)
+        if entry is None or entry[1] <= time.monotonic():
+            self._buffers.pop(conversation_id, None)
+            self.misses += 1
+            return None
+        self._buffers.move_to_end(conversation_id)
+        self.hits += 1
+        messages = list(entry[0])
+        return messages[-limit:] if limit else []
+
+    def fill(self, conversation_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Buffer the latest messages of a conversation (oldest first), e.g. from a query.
+
+        ``messages`` must be every message of the conversation or at least its
+        latest ``max_messages``; a new conversation is filled with ``[]``.
+        """
+        if not self.enabled:
+            return
+        self._buffers[conversation_id] = (deque(messages, maxlen=self.max_messages), time.monotonic() + self.ttl)
+        self._buffers.move_to_end(conversation_id)
+        while len(self._buffers) > self.max_conversations:
+            self._buffers.popitem(last=False)
+            self.evictions += 1
+
+    def append(self, conversation_id: str, message: Dict[str, Any]) -> None:
+        """Write a new message through to the conversation's buffer, if it is buffered"""
+        entry = self._buffers.get(conversation_id)
+        if entry is None:
+            # Appending to an unbuffered conversation would leave a gap before it
+            return
+        entry[0].append(message)
+        self._buffers[conversation_id] = (entry[0], time.monotonic() + self.ttl)
+        self._buffers.move_to_end(conversation_id)
+
+    def discard(self, conversation_id: str) -> None:
+        self._buffers.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "conversations": len(self._buffers),
+            "max_conversations": self.max_conversations,
+            "max_messages": self.max_messages,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+history_cache = HistoryCache(
+    max_messages=int(os.getenv("HISTORY_CACHE_MESSAGES", "10")),
+    max_conversations=int(os.getenv("HISTORY_CACHE_CONVERSATIONS", "5000")),
+    ttl=float(os.getenv("HISTORY_CACHE_TTL", "300")),
+    enabled=os.getenv("HISTORY_CACHE_ENABLED", "true").lower() == "true",
+)
@@ -0,0 +1,159 @@
+"""
+Intent router for chat messages.
+
+Every trigger phrase of every intent is compiled once into a single
+case-insensitive alternation regex with word boundaries, so routing a message
+is one regex scan instead of a substring search per keyword. A message can
+match several intents ("what's the stock for order 55" is both ``inventory``
+and ``order_status``); each gets a confidence that combines the weights of
+its matched phrases as a noisy-OR, and the best one is the primary intent.
+
+Slots are extracted in the same scan: integers are order id candidates, and
+the words left after removing trigger phrases, numbers and chat stop words
+are the product span handed to the product resolver.
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+from product_search import STOP_WORDS as PRODUCT_STOP_WORDS
+
+# Trigger phrases per intent with how strongly each one indicates it
+TRIGGERS = {
+    "top_products": {
+        "most sold": 0.9, "best selling": 0.9, "best sellers": 0.9, "bestseller": 0.9, "bestsellers": 0.9,
+        "top selling": 0.9, "most popular": 0.9, "top": 0.6, "popular": 0.6, "best": 0.6, "trending": 0.6,
+    },
+    "order_status": {
+        "order status": 0.9, "tracking": 0.9, "track": 0.8, "where is my": 0.8, "order": 0.6, "orders": 0.6,
+        "shipped": 0.6, "shipping": 0.5, "delivered": 0.6, "delivery": 0.5, "status": 0.4,
+    },
+    "inventory": {
+        "inventory": 0.9, "in stock": 0.9, "out of stock": 0.9, "stock": 0.8, "availability": 0.8,
+        "available": 0.6, "how many": 0.5, "remaining": 0.5, "left": 0.4,
+    },
+    "help": {
+        "what can you do": 0.9, "capabilities": 0.9, "help": 0.6,
+    },
+}
+
+# Tie-break between equally confident intents (the old if/elif order)
+INTENT_PRIORITY = ["top_products", "order_status", "inventory", "help"]
+
+# Extra confidence for order_status when the message also contains a number
+ORDER_ID_WEIGHT = 0.5
+
+# Secondary intents below this confidence are not served
+MIN_SECONDARY_CONFIDENCE = 0.5
+
+# Confidence reported when no trigger phrase matched
+GENERAL_CONFIDENCE = 0.5
+
+# Words that never name a product, on top of the product resolver's stop words
+STOP_WORDS = PRODUCT_STOP_WORDS | {
+    "product", "products", "item", "sell", "sells", "sold", "selling", "id", "number",
+    "hi", "hello", "hey", "thanks", "question", "where", "when", "why", "yet", "hasnt", "havent", "isnt",
+}
+
+def _trie_pattern(phrases: List[str]) -> str:
+    """Regex alternation for ``phrases`` factored into a character trie.
+
+    Sharing prefixes ("best", "best selling", "bestseller") means the regex
+    engine rejects a non-matching word after a character or two instead of
+    trying every phrase in turn.
+    """
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        optional = "" in node
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+def _compile_triggers() -> Tuple[re.Pattern, Dict[str, List[Tuple[str, float]]]]:
+    phrase_intents: Dict[str, List[Tuple[str, float]]] = {}
+    for intent, phrases in TRIGGERS.items():
+        for phrase, weight in phrases.items():
+            phrase_intents.setdefault(phrase, []).append((intent, weight))
+    # One scan tokenizes the message: group 1 is a number, group 2 a trigger
+    # phrase (longest match wins) and group 3 any other word
+    pattern = rf"(\d+)\b|({_trie_pattern(list(phrase_intents))})\b|([\w']+)"
+    return re.compile(pattern, re.IGNORECASE), phrase_intents
+
+TOKEN_RE, PHRASE_INTENTS = _compile_triggers()
+
+class IntentRouter:
+    def __init__(self, min_secondary_confidence: float = MIN_SECONDARY_CONFIDENCE):
+        self.min_secondary_confidence = min_secondary_confidence
+
+    def route(self, message: str) -> Dict[str, Any]:
+        """Matched intents with confidences (best first) and slots for ``message``"""
+        message = message or ""
+        misses: Dict[str, float] = {}
+        triggers: Dict[str, List[str]] = {}
+        order_ids: List[int] = []
+        product_words: List[str] = []
+        product_spans: List[List[int]] = []
+        for match in TOKEN_RE.finditer(message):
+            number, phrase, word = match.groups()
+            if word is not None:
+                word = word.replace("'", "").lower()
+                if word in STOP_WORDS:
+                    continue
+                start, end = match.span()
+                product_words.append(word)
+                # Extend the current span when only whitespace separates the two words
+                if product_spans and not message[product_spans[-1][1]:start].strip():
+                    product_spans[-1][1] = end
+                else:
+                    product_spans.append([start, end])
+                continue
+            if number is not None:
+                order_ids.append(int(number))
+            else:
+                phrase = " ".join(phrase.lower().split())
+                for intent, weight in PHRASE_INTENTS[phrase]:
+                    # Noisy-OR: confidence = 1 - product of (1 - weight) over matched phrases
+                    misses[intent] = misses.get(intent, 1.0) * (1 - weight)
+                    triggers.setdefault(intent, []).append(phrase)
+        if order_ids and "order_status" in misses:
+            misses["order_status"] *= 1 - ORDER_ID_WEIGHT
+
+        intents = sorted(
+            (
+                {"intent": intent, "confidence": round(1 - miss, 4), "triggers": triggers[intent]}
+                for intent, miss in misses.items()
+            ),
+            key=lambda m: (-m["confidence"], INTENT_PRIORITY.index(m["intent"]))
+        )
+        if intents:
+            intents = intents[:1] + [m for m in intents[1:] if m["confidence"] >= self.min_secondary_confidence]
+        else:
+            intents = [{"intent": "general", "confidence": GENERAL_CONFIDENCE, "triggers": []}]
+
+        return {
+            "intent": intents[0]["intent"],
+            "confidence": intents[0]["confidence"],
+            "intents": intents,
+            "slots": {
+                "order_ids": order_ids,
+                "product_text": " ".join(product_words),
+                "product_spans": product_spans,
+            },
+        }
+
+intent_router = IntentRouter()
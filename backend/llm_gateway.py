@@ -0,0 +1,272 @@
+"""
+Gateway between ``LLMService`` and the Groq client.
+
+- at most ``max_in_flight`` LLM calls run at once in the process; the rest
+  wait for a slot
+- identical prompts in flight at the same time share one call (single-flight)
+- each caller has a deadline covering the wait for a slot and the call. When
+  it expires the caller gets ``LLMUnavailable`` and answers from its template,
+  while the call itself carries on (up to the client timeout) so a late answer
+  still lands in the response cache
+- a circuit breaker opens once the error rate over the last
+  ``breaker_window`` calls reaches ``breaker_error_rate``; while it is open,
+  calls fail at once without touching Groq. After ``breaker_cooldown``
+  seconds a single probe call is let through, and its outcome closes or
+  reopens the breaker
+
+Expired deadlines count as errors for the breaker, so a slow Groq trips it
+as surely as a failing one.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LLMUnavailable(Exception):
+    """The LLM cannot answer this call: its deadline expired or the circuit is open"""
+
+def prompt_key(request: Dict[str, Any]) -> str:
+    """Single-flight key for a chat-completion request"""
+    return hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+class _Flight:
+    def __init__(self, probe: bool):
+        self.task: Optional[asyncio.Task] = None
+        self.probe = probe
+        self.waiters = 0
+        self.started = False
+        self.recorded = False
+
+class LLMGateway:
+    def __init__(self, max_in_flight: int = 32, deadline: float = 8.0, breaker_window: int = 20,
+                 breaker_min_calls: int = 10, breaker_error_rate: float = 0.5, breaker_cooldown: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.deadline = deadline
+        self.breaker_min_calls = breaker_min_calls
+        self.breaker_error_rate = breaker_error_rate
+        self.breaker_cooldown = breaker_cooldown
+        # Created on first use, inside the running event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._flights: Dict[str, _Flight] = {}
+        # Outcomes (True = success) of the latest calls, for the breaker
+        self._outcomes: deque = deque(maxlen=breaker_window)
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.successes = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.deadline_exceeded = 0
+        self.short_circuited = 0
+        self.breaker_opened = 0
+        self.call_seconds = 0.0
+
+    async def call(self, call: Callable[[], Awaitable[Any]], key: Optional[str] = None,
+                   use_deadline: bool = True) -> Any:
+        """Result of ``call()``, run through the limiter, coalescing and breaker.
+
+        Calls with the same ``key`` in flight together share one call.
+        Background work (summaries, polishing) passes ``use_deadline=False``
+        and is only bounded by the client timeout. Raises ``LLMUnavailable``
+        when the circuit is open or the deadline expires.
+        """
+        flight = self._flights.get(key) if key else None
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            flight = _Flight(probe=self._admit())
+            flight.task = asyncio.create_task(self._run(flight, call))
+            flight.task.add_done_callback(lambda task: self._finished(key, flight, task))
+            if key:
+                self._flights[key] = flight
+
+        flight.waiters += 1
+        try:
+            if use_deadline and self.deadline:
+                return await asyncio.wait_for(asyncio.shield(flight.task), self.deadline)
+            return await asyncio.shield(flight.task)
+        except asyncio.TimeoutError:
+            if flight.task.done():
+                # The call itself timed out (client timeout)
+                raise
+            self.deadline_exceeded += 1
+            self._record(flight, False)
+            raise LLMUnavailable(f"LLM did not answer within {self.deadline}s")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.started:
+                # Everyone gave up before the call got a slot
+                flight.task.cancel()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """In-flight slot for a streaming call, which cannot be shared.
+
+        Yields the seconds left of the deadline for opening the stream. An
+        exception raised in the block counts as an error for the breaker.
+        """
+        flight = _Flight(probe=self._admit())
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._acquire(), self.deadline or None)
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            self._record(flight, False)
+            raise LLMUnavailable(f"No LLM slot free within {self.deadline}s")
+        except asyncio.CancelledError:
+            self._abandon(flight)
+            raise
+
+        flight.started = True
+        call_started = time.monotonic()
+        try:
+            remaining = self.deadline - (call_started - started) if self.deadline else None
+            yield max(remaining, 0.001) if remaining is not None else None
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.deadline_exceeded += 1
+            else:
+                self.errors += 1
+            self._record(flight, False)
+            raise
+        except BaseException:
+            # Cancelled, or the stream's consumer went away
+            self._abandon(flight)
+            raise
+        else:
+            self.successes += 1
+            self._record(flight, True)
+        finally:
+            self._release(call_started)
+
+    def _admit(self) -> bool:
+        """Check the breaker for a new call; returns whether the call is the half-open probe"""
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.breaker_cooldown:
+                self.short_circuited += 1
+                raise LLMUnavailable("LLM circuit breaker is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.short_circuited += 1
+                raise LLMUnavailable("LLM circuit breaker is half-open; probe in flight")
+            self._probing = True
+            return True
+        return False
+
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.calls += 1
+
+    def _release(self, started: float):
+        self.in_flight -= 1
+        self.call_seconds += time.monotonic() - started
+        self._slots.release()
+
+    async def _run(self, flight: _Flight, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            await self._acquire()
+        except asyncio.CancelledError:
+            self._abandon(flight)
+            raise
+        flight.started = True
+        started = time.monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._abandon(flight)
+            raise
+        except Exception:
+            self.errors += 1
+            self._record(flight, False)
+            raise
+        finally:
+            self._release(started)
+        self.successes += 1
+        self._record(flight, True)
+        return result
+
+    def _finished(self, key: Optional[str], flight: _Flight, task: asyncio.Task):
+        if key and self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieve the exception in case every caller already gave up
+            task.exception()
+
+    def _record(self, flight: _Flight, ok: bool):
+        """Feed a call's outcome (once per call) to the breaker"""
+        if flight.recorded:
+            return
+        flight.recorded = True
+        if flight.probe:
+            self._probing = False
+            if ok:
+                logger.info("LLM circuit breaker closed")
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+        self._outcomes.append(ok)
+        if self.state == "closed" and len(self._outcomes) >= self.breaker_min_calls and \
+                self._outcomes.count(False) / len(self._outcomes) >= self.breaker_error_rate:
+            self._open()
+
+    def _abandon(self, flight: _Flight):
+        """A call was cancelled without an outcome; let another probe through"""
+        if flight.probe and not flight.recorded:
+            flight.recorded = True
+            self._probing = False
+
+    def _open(self):
+        if self.state != "open":
+            logger.warning(f"LLM circuit breaker opened for {self.breaker_cooldown}s")
+            self.breaker_opened += 1
+        self.state = "open"
+        self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        outcomes = len(self._outcomes)
+        return {
+            "breaker_state": self.state,
+            "recent_error_rate": round(self._outcomes.count(False) / outcomes, 4) if outcomes else 0.0,
+            "breaker_opened": self.breaker_opened,
+            "short_circuited": self.short_circuited,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "successes": self.successes,
+            "errors": self.errors,
+            "coalesced": self.coalesced,
+            "deadline_exceeded": self.deadline_exceeded,
+            "deadline_seconds": self.deadline,
+            "avg_call_ms": round(self.call_seconds * 1000 / self.calls, 1) if self.calls else 0.0,
+        }
+
+llm_gateway = LLMGateway(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "32")),
+    deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "8")),
+    breaker_window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+    breaker_min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+    breaker_error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+    breaker_cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30")),
+)
@@ -1,8 +1,20 @@
 import os
+import time
+import asyncio
 import groq
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from models import Product, Order, InventoryItem, User, EcommerceUser
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Callable
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Order, InventoryItem, ProductSalesRollup, DistributionCenter
+from database import AnalyticsSessionLocal, analytics_engine
+from product_search import product_index
+from response_cache import response_cache
+from semantic_cache import semantic_cache
+from data_cache import data_cache
+from intent_router import intent_router
+from context_builder import build_context, estimate_tokens, truncate_to_tokens, SUMMARY_TOKEN_BUDGET
+from metrics import StageTimings, llm_call_seconds, record_llm_usage
+from llm_gateway import llm_gateway, prompt_key, LLMUnavailable
 import logging
 from dotenv import load_dotenv
 
@@ -10,22 +22,151 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# How each intent is answered:
+#   template           formatted straight from the structured data, no LLM call
+#   llm                worded by the LLM (cached answers are reused)
+#   template-then-llm  template answer now, LLM-polished version delivered later
+RESPONSE_POLICIES = ("template", "llm", "template-then-llm")
+
+# Order status and inventory answers are fully determined by the data
+DEFAULT_RESPONSE_POLICIES = {
+    "top_products": "llm",
+    "order_status": "template",
+    "inventory": "template",
+    "help": "llm",
+    "general": "llm",
+}
+
+def response_policies_from_env() -> Dict[str, str]:
+    """Per-intent response policies, overridable with RESPONSE_POLICY_<INTENT>"""
+    policies = {}
+    for intent, default in DEFAULT_RESPONSE_POLICIES.items():
+        policy = os.getenv(f"RESPONSE_POLICY_{intent.upper()}", default).lower()
+        if policy not in RESPONSE_POLICIES:
+            logger.warning(f"Unknown response policy '{policy}' for {intent}; using '{default}'")
+            policy = default
+        policies[intent] = policy
+    return policies
+
+# Most transcript tokens sent to the LLM in one summary update
+SUMMARY_INPUT_TOKENS = 2000
+
+# Key each data-backed intent contributes to a turn's data payload
+DATA_KEYS = {
+    "top_products": "top_products",
+    "order_status": "order",
+    "inventory": "inventory",
+}
+
+def _groq_client(base_url: Optional[str] = None, api_key: Optional[str] = None):
+    # Hard limits per call; callers get the shorter LLM_DEADLINE_SECONDS from the gateway
+    return groq.AsyncGroq(
+        api_key=api_key or os.getenv("GROQ_API_KEY"),
+        base_url=base_url,
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "1"))
+    )
+
+# LLM backends by name. A backend is a factory for a client with Groq's
+# (OpenAI-style) ``client.chat.completions.create(model=..., messages=...,
+# max_tokens=..., temperature=..., stream=...)`` interface.
+LLM_BACKENDS: Dict[str, Callable[[], Any]] = {
+    "groq": lambda: _groq_client(base_url=os.getenv("LLM_BASE_URL") or None),
+    # llm_stub_server.py, or any other server speaking Groq's chat-completions API
+    "stub": lambda: _groq_client(base_url=os.getenv("LLM_BASE_URL", "http://127.0.0.1:8001"), api_key="stub"),
+}
+
+def register_llm_backend(name: str, factory: Callable[[], Any]) -> None:
+    """Make another LLM backend selectable with LLM_BACKEND=<name>"""
+    LLM_BACKENDS[name] = factory
+
 class LLMService:
-    def __init__(self):
-        self.client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = "llama3-8b-8192"  # Using Llama3 model via Groq
-        
-    def generate_response(self, user_message: str, conversation_history: List[Dict], db: Session) -> Dict[str, Any]:
-        """Generate intelligent response using LLM and database queries"""
-        
-        # Analyze user intent
-        intent = self._analyze_intent(user_message)
-        
-        # Get relevant data based on intent
-        data = self._get_relevant_data(intent, user_message, db)
-        
-        # Generate response using LLM
-        response = self._generate_llm_response(user_message, intent, data, conversation_history)
+    def __init__(self, backend: Optional[str] = None, client: Any = None):
+        """``client`` overrides the backend; otherwise ``backend`` (default LLM_BACKEND, ``groq``) picks it"""
+        self.backend = backend or os.getenv("LLM_BACKEND", "groq")
+        if client is None:
+            if self.backend not in LLM_BACKENDS:
+                raise ValueError(f"Unknown LLM backend '{self.backend}'; available: {', '.join(LLM_BACKENDS)}")
+            client = LLM_BACKENDS[self.backend]()
+        self.client = client
+        self.model = os.getenv("LLM_MODEL", "llama3-8b-8192")  # Using Llama3 model via Groq
+        self.max_inventory_products = 1000  # Cap on product ids resolved for one inventory question
+        self.response_policies = response_policies_from_env()
+        # Background rebuild of the product index after the loader has written
+        self._index_refresh: Optional[asyncio.Task] = None
+        
+    async def generate_response(self, user_message: str, conversation_history: List[Dict], db: AsyncSession,
+                                summary: Optional[str] = None, timings: Optional[StageTimings] = None) -> Dict[str, Any]:
+        """Generate intelligent response using LLM and database queries.
+        
+        ``summary`` is the conversation's rolling summary of turns older than
+        ``conversation_history``. The ``route``, ``data`` and ``generate``
+        stages are timed into ``timings`` when given.
+        """
+        timings = timings or StageTimings()
+        
+        # Route the message to its intents; the best match is the primary intent
+        with timings.stage("route"):
+            route = intent_router.route(user_message)
+        
+        # Get relevant data for every routed intent
+        with timings.stage("data"):
+            data = await self._get_relevant_data(route, db)
+        
+        with timings.stage("generate"):
+            return await self._answer(user_message, route, data, conversation_history, summary)
+    
+    async def generate_batch(self, turns: List[Dict[str, Any]], db: AsyncSession,
+                             concurrency: int = 8) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Answer many messages at once, yielding ``(index, response)`` as each finishes.
+        
+        Each turn is a dict with ``message`` and optionally ``history`` and
+        ``summary``. Routing and data lookups run for the whole batch first
+        (all order ids in one query); then at most ``concurrency`` LLM calls
+        are in flight while template and cached answers are yielded at once.
+        """
+        routes = [intent_router.route(turn["message"]) for turn in turns]
+        batch_data = await self._get_batch_data(routes, db)
+        llm_slots = asyncio.Semaphore(concurrency)
+        
+        async def answer(index: int) -> Tuple[int, Dict[str, Any]]:
+            turn = turns[index]
+            return index, await self._answer(turn["message"], routes[index], batch_data[index],
+                                             turn.get("history") or [], turn.get("summary"), llm_slots)
+        
+        tasks = [asyncio.create_task(answer(index)) for index in range(len(turns))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # The consumer stopped early (e.g. a streaming client went away)
+            for task in tasks:
+                task.cancel()
+    
+    async def _answer(self, user_message: str, route: Dict[str, Any], data: Dict[str, Any],
+                      conversation_history: List[Dict], summary: Optional[str] = None,
+                      llm_slots: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """Answer a routed message from its data, per the primary intent's response policy"""
+        intent = route["intent"]
+        policy = self.response_policy(intent)
+        if policy == "llm":
+            # Serve repeated or near-duplicate questions over unchanged data from cache
+            response, cache_metadata = self._cached_response(intent, data, user_message)
+            response_path = "cache" if response is not None else "llm"
+            
+            # Generate response using LLM
+            if response is None:
+                if llm_slots is None:
+                    response, response_path = await self._generate_llm_response(
+                        user_message, intent, data, conversation_history, summary)
+                else:
+                    async with llm_slots:
+                        response, response_path = await self._generate_llm_response(
+                            user_message, intent, data, conversation_history, summary)
+        else:
+            # Answer from the structured data; the LLM stays off the critical path
+            response, cache_metadata = self._fallback_response(intent, data), {"cache_hit": False}
+            response_path = "template"
         
         return {
             "response": response,
@@ -33,68 +174,199 @@ class LLMService:
             "data": data,
             "metadata": {
                 "model": self.model,
-                "confidence": 0.9
+                **self._route_metadata(route),
+                **cache_metadata,
+                **self._policy_metadata(policy, response_path)
             }
         }
     
-    def _analyze_intent(self, message: str) -> str:
-        """Analyze user intent from message"""
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ["top", "popular", "best", "most sold"]):
-            return "top_products"
-        elif any(word in message_lower for word in ["order", "status", "tracking"]):
-            return "order_status"
-        elif any(word in message_lower for word in ["stock", "inventory", "available", "left"]):
-            return "inventory"
-        elif any(word in message_lower for word in ["help", "what can you do", "capabilities"]):
-            return "help"
-        else:
-            return "general"
+    def response_policy(self, intent: str) -> str:
+        return self.response_policies.get(intent, "llm")
     
-    def _get_relevant_data(self, intent: str, message: str, db: Session) -> Dict[str, Any]:
-        """Get relevant data from database based on intent"""
+    def _policy_metadata(self, policy: str, response_path: str) -> Dict[str, Any]:
+        metadata = {"response_policy": policy, "response_path": response_path}
+        if policy == "template-then-llm":
+            metadata["polish_pending"] = True
+        return metadata
+    
+    async def polish_response(self, user_message: str, intent: str, data: Dict, conversation_history: List[Dict],
+                              summary: Optional[str] = None) -> Optional[str]:
+        """LLM-worded version of an answer already given from its template.
+        
+        Returns None when the LLM is unavailable, in which case the template
+        answer simply stands.
+        """
+        cached, _ = self._cached_response(intent, data, user_message)
+        if cached is not None:
+            return cached
         try:
-            if intent == "top_products":
-                return self._get_top_products(db)
-            elif intent == "order_status":
-                return self._get_order_status(message, db)
-            elif intent == "inventory":
-                return self._get_inventory_status(message, db)
-            else:
-                return {}
+            return await self._complete(user_message, intent, data, conversation_history, summary, use_deadline=False)
         except Exception as e:
-            logger.error(f"Error getting data: {e}")
-            return {}
+            logger.warning(f"Could not polish {intent} response: {e}")
+            return None
+    
+    def _cached_response(self, intent: str, data: Dict, user_message: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Answer from the exact-match or near-duplicate cache, plus cache metadata"""
+        response = response_cache.get(response_cache.make_key(intent, data, user_message, self.model))
+        if response is not None:
+            return response, {"cache_hit": True, "cache": "exact"}
+        
+        match = semantic_cache.lookup(intent, data, user_message, self.model)
+        if match:
+            return match["response"], {"cache_hit": True, "cache": "semantic", "similarity": match["similarity"]}
+        
+        return None, {"cache_hit": False}
+    
+    def _cache_response(self, intent: str, data: Dict, user_message: str, response: str, llm_seconds: float):
+        """Store a successful LLM answer in both caches"""
+        response_cache.set(response_cache.make_key(intent, data, user_message, self.model),
+                           response, intent, user_message, self.model)
+        semantic_cache.store(intent, data, user_message, self.model, response)
+        semantic_cache.record_llm_latency(llm_seconds * 1000)
+    
+    def _route_metadata(self, route: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "confidence": route["confidence"],
+            "intents": [{"intent": m["intent"], "confidence": m["confidence"]} for m in route["intents"]]
+        }
+    
+    def _served_intents(self, intent: str, data: Dict) -> List[str]:
+        """The primary intent, then every secondary intent whose data is in ``data``"""
+        return [intent] + [other for other, key in DATA_KEYS.items() if other != intent and data.get(key)]
+    
+    async def _sync_data_version(self, db: AsyncSession):
+        """Drop every cache derived from the dataset once the loader has written"""
+        try:
+            if await data_cache.check_version(db):
+                response_cache.clear()
+                semantic_cache.clear()
+                self._refresh_product_index()
+        except Exception as e:
+            logger.warning(f"Could not check dataset version: {e}")
+    
+    def _refresh_product_index(self):
+        """Rebuild the product index in a worker thread, unless a rebuild is already running.
+        
+        Requests are not held up: they search the current index until the
+        rebuilt one is swapped in.
+        """
+        if self._index_refresh is not None and not self._index_refresh.done():
+            return
+        
+        async def reload():
+            try:
+                await asyncio.to_thread(product_index.reload)
+            except Exception as e:
+                logger.error(f"Error refreshing product index: {e}")
+        
+        self._index_refresh = asyncio.create_task(reload())
+    
+    async def _get_relevant_data(self, route: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
+        """Get data for every routed intent, primary intent first.
+        
+        Secondary intents only contribute data when their lookup succeeds, so
+        an ``error`` in the payload always belongs to the primary intent. With
+        ``ANALYTICS_DATABASE_URL`` set, the lookups (and the dataset version
+        check) run on the replica rather than the request's session.
+        """
+        return (await self._get_batch_data([route], db))[0]
+    
+    async def _get_batch_data(self, routes: List[Dict[str, Any]], db: AsyncSession) -> List[Dict[str, Any]]:
+        """``_get_relevant_data`` for many routes, sharing the lookups between them"""
+        if analytics_engine is None:
+            return await self._collect_data(routes, db)
+        async with AnalyticsSessionLocal() as analytics_db:
+            return await self._collect_data(routes, analytics_db)
+    
+    async def _collect_data(self, routes: List[Dict[str, Any]], db: AsyncSession) -> List[Dict[str, Any]]:
+        await self._sync_data_version(db)
+        
+        # Every order asked about in the batch, looked up with one IN (...) query
+        order_ids = sorted({
+            route["slots"]["order_ids"][0] for route in routes
+            if route["slots"]["order_ids"] and any(m["intent"] == "order_status" for m in route["intents"])
+        })
+        orders = None
+        if order_ids:
+            try:
+                orders = await self._get_orders(order_ids, db)
+            except Exception as e:
+                logger.error(f"Error getting orders {order_ids}: {e}")
+        
+        # The session runs one query at a time, so the remaining lookups go in turn
+        batch_data = []
+        for route in routes:
+            data: Dict[str, Any] = {}
+            for position, match in enumerate(route["intents"]):
+                try:
+                    result = await self._get_intent_data(match["intent"], route["slots"], db, orders)
+                except Exception as e:
+                    logger.error(f"Error getting {match['intent']} data: {e}")
+                    continue
+                if position == 0 or "error" not in result:
+                    data.update(result)
+            batch_data.append(data)
+        return batch_data
+    
+    async def _get_intent_data(self, intent: str, slots: Dict[str, Any], db: AsyncSession,
+                               orders: Optional[Dict[int, Any]] = None) -> Dict[str, Any]:
+        """Get relevant data from database for one intent"""
+        if intent == "top_products":
+            return await self._get_top_products(db)
+        elif intent == "order_status":
+            return await self._get_order_status(slots["order_ids"], db, orders)
+        elif intent == "inventory":
+            return await self._get_inventory_status(slots["product_text"], db)
+        return {}
+    
+    async def _get_top_products(self, db: AsyncSession, limit: int = 5) -> Dict[str, Any]:
+        """Get top selling products, cached until the dataset changes"""
+        return await data_cache.get_or_load("top_products", limit, lambda: self._query_top_products(db, limit))
     
-    def _get_top_products(self, db: Session) -> Dict[str, Any]:
-        """Get top selling products"""
-        # Count products by name
-        from sqlalchemy import func
-        top_products = db.query(
-            Product.name,
-            func.count(Product.id).label('count')
-        ).group_by(Product.name).order_by(func.count(Product.id).desc()).limit(5).all()
+    async def _query_top_products(self, db: AsyncSession, limit: int) -> Dict[str, Any]:
+        """Top selling products from the sales rollup (indexed on units_sold)"""
+        result = await db.execute(select(ProductSalesRollup).order_by(
+            ProductSalesRollup.units_sold.desc()
+        ).limit(limit))
+        top_products = result.scalars().all()
         
         return {
-            "top_products": [{"name": p.name, "count": p.count} for p in top_products]
+            "top_products": [
+                {
+                    "product_id": p.product_id,
+                    "name": p.product_name,
+                    "count": p.units_sold,
+                    "revenue": round(p.revenue or 0, 2),
+                    "returned_units": p.returned_units
+                }
+                for p in top_products
+            ]
         }
     
-    def _get_order_status(self, message: str, db: Session) -> Dict[str, Any]:
-        """Get order status by order ID"""
-        import re
-        order_id_match = re.search(r'(\d+)', message)
-        if not order_id_match:
+    async def _get_order_status(self, order_ids: List[int], db: AsyncSession,
+                                orders: Optional[Dict[int, Any]] = None) -> Dict[str, Any]:
+        """Get order status by order ID, from ``orders`` when it was looked up already"""
+        if not order_ids:
             return {"error": "No order ID found in message"}
         
-        order_id = int(order_id_match.group(1))
-        order = db.query(Order).filter(Order.order_id == order_id).first()
+        order_id = order_ids[0]
+        if orders is None or order_id not in orders:
+            orders = await self._get_orders([order_id], db)
+        order = orders.get(order_id)
         
         if not order:
             return {"error": f"Order {order_id} not found"}
         
+        return {"order": order}
+    
+    async def _get_orders(self, order_ids: List[int], db: AsyncSession) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Orders by id, cached; the ones not cached are queried together"""
+        return await data_cache.get_many("order_status", order_ids, lambda missing: self._query_orders(db, missing))
+    
+    async def _query_orders(self, db: AsyncSession, order_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        result = await db.execute(select(Order).filter(Order.order_id.in_(order_ids)))
         return {
-            "order": {
+            order.order_id: {
                 "order_id": order.order_id,
                 "status": order.status,
                 "created_at": order.created_at,
@@ -102,46 +374,239 @@ class LLMService:
                 "delivered_at": order.delivered_at,
                 "num_of_item": order.num_of_item
             }
+            for order in result.scalars().all()
         }
     
-    def _get_inventory_status(self, message: str, db: Session) -> Dict[str, Any]:
-        """Get inventory status for products"""
-        import re
+    async def _get_inventory_status(self, product_text: str, db: AsyncSession) -> Dict[str, Any]:
+        """Get inventory status for the products named in the message's product span"""
+        if not product_index.size:
+            await asyncio.to_thread(product_index.reload)
         
-        # Extract product name from message
-        product_name_match = re.search(r'([A-Za-z\s]+)', message)
-        if not product_name_match:
+        match = product_index.resolve(product_text, limit=self.max_inventory_products)
+        if not match["terms"]:
             return {"error": "No product name found in message"}
         
-        product_name = product_name_match.group(1).strip()
-        
-        # Query inventory items
-        inventory_items = db.query(InventoryItem).filter(
-            InventoryItem.product_name.ilike(f"%{product_name}%")
-        ).all()
-        
-        if not inventory_items:
+        product_name = " ".join(match["terms"])
+        if not match["product_ids"]:
             return {"error": f"No inventory found for '{product_name}'"}
         
-        # Calculate availability
-        total_items = len(inventory_items)
-        available_items = len([item for item in inventory_items if item.sold_at is None])
-        sold_items = total_items - available_items
+        product_ids = tuple(match["product_ids"])
+        inventory = await data_cache.get_or_load(
+            "inventory", product_ids,
+            lambda: self._aggregate_inventory(db, InventoryItem.product_id.in_(product_ids))
+        )
+        if not inventory:
+            return {"error": f"No inventory found for '{product_name}'"}
         
+        # Cached lookups are shared, so copy before adding per-message fields
+        return {"inventory": {**inventory, "product_name": product_name}}
+    
+    async def _aggregate_inventory(self, db: AsyncSession, criterion, breakdown_limit: int = 10) -> Optional[Dict[str, Any]]:
+        """Availability totals plus per-product and per-distribution-center breakdowns.
+        
+        Everything is aggregated in SQL, so the Python side only ever sees a
+        bounded number of rows however many inventory items match.
+        """
+        available = func.sum(case((InventoryItem.sold_at.is_(None), 1), else_=0))
+        
+        totals = (await db.execute(select(
+            func.count(InventoryItem.id).label("total"),
+            available.label("available"),
+            func.count(func.distinct(InventoryItem.product_id)).label("products")
+        ).filter(criterion))).one()
+        
+        if not totals.total:
+            return None
+        
+        by_product = (await db.execute(select(
+            InventoryItem.product_id,
+            func.max(InventoryItem.product_name).label("product_name"),
+            func.count(InventoryItem.id).label("total"),
+            available.label("available")
+        ).filter(criterion).group_by(InventoryItem.product_id).order_by(
+            available.desc()
+        ).limit(breakdown_limit))).all()
+        
+        by_center = (await db.execute(select(
+            InventoryItem.product_distribution_center_id,
+            DistributionCenter.name,
+            func.count(InventoryItem.id).label("total"),
+            available.label("available")
+        ).outerjoin(
+            DistributionCenter, DistributionCenter.id == InventoryItem.product_distribution_center_id
+        ).filter(criterion).group_by(
+            InventoryItem.product_distribution_center_id, DistributionCenter.name
+        ).order_by(available.desc()))).all()
+        
+        total_items = int(totals.total)
+        available_items = int(totals.available or 0)
         return {
-            "inventory": {
-                "product_name": product_name,
-                "total_items": total_items,
-                "available_items": available_items,
-                "sold_items": sold_items
+            "total_items": total_items,
+            "available_items": available_items,
+            "sold_items": total_items - available_items,
+            "matched_products": int(totals.products),
+            "products": [
+                {
+                    "product_id": p.product_id,
+                    "product_name": p.product_name,
+                    "total_items": int(p.total),
+                    "available_items": int(p.available or 0),
+                    "sold_items": int(p.total) - int(p.available or 0)
+                }
+                for p in by_product
+            ],
+            "distribution_centers": [
+                {
+                    "distribution_center_id": c.product_distribution_center_id,
+                    "name": c.name,
+                    "total_items": int(c.total),
+                    "available_items": int(c.available or 0)
+                }
+                for c in by_center
+            ]
+        }
+    
+    async def _complete(self, user_message: str, intent: str, data: Dict, conversation_history: List[Dict],
+                        summary: Optional[str] = None, use_deadline: bool = True) -> str:
+        """One Groq chat completion for a turn, through the gateway; successful answers are cached"""
+        request = {
+            "model": self.model,
+            "messages": self._build_messages(user_message, intent, data, conversation_history, summary),
+            "max_tokens": 500,
+            "temperature": 0.7
+        }
+        
+        async def call() -> str:
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(**request)
+            llm_call_seconds.observe(time.perf_counter() - started, purpose="chat")
+            record_llm_usage("chat", response.usage)
+            content = response.choices[0].message.content.strip()
+            # Cached here rather than by the caller, so an answer that arrives
+            # after the caller's deadline is still kept
+            self._cache_response(intent, data, user_message, content, time.perf_counter() - started)
+            return content
+        
+        return await llm_gateway.call(call, key=prompt_key(request), use_deadline=use_deadline)
+    
+    async def _generate_llm_response(self, user_message: str, intent: str, data: Dict, conversation_history: List[Dict],
+                                     summary: Optional[str] = None) -> Tuple[str, str]:
+        """Generate response using LLM; returns the response and its path (``llm`` or ``template``)"""
+        try:
+            return await self._complete(user_message, intent, data, conversation_history, summary), "llm"
+        except LLMUnavailable as e:
+            logger.warning(f"Answering {intent} from its template: {e}")
+        except Exception as e:
+            logger.error(f"Error generating LLM response: {e}")
+        return self._fallback_response(intent, data), "template"
+    
+    async def stream_response(self, user_message: str, conversation_history: List[Dict], db: AsyncSession,
+                              summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a response as events: ``data`` first, then ``token`` chunks, then ``done``.
+        
+        The ``done`` event carries the assembled response and its metadata,
+        including time-to-first-token measured from the start of the turn.
+        """
+        started = time.perf_counter()
+        route = intent_router.route(user_message)
+        intent = route["intent"]
+        data = await self._get_relevant_data(route, db)
+        yield {"event": "data", "intent": intent, "data": data}
+        
+        policy = self.response_policy(intent)
+        if policy == "llm":
+            cached, cache_metadata = self._cached_response(intent, data, user_message)
+            response_path = "cache"
+        else:
+            cached, cache_metadata = self._fallback_response(intent, data), {"cache_hit": False}
+            response_path = "template"
+        if cached is not None:
+            first_token_at = time.perf_counter()
+            yield {"event": "token", "content": cached}
+            yield {
+                "event": "done",
+                "intent": intent,
+                "response": cached,
+                "metadata": {
+                    "model": self.model,
+                    **self._route_metadata(route),
+                    "streamed": True,
+                    **cache_metadata,
+                    **self._policy_metadata(policy, response_path),
+                    "time_to_first_token_ms": round((first_token_at - started) * 1000, 1),
+                    "total_time_ms": round((time.perf_counter() - started) * 1000, 1)
+                }
+            }
+            return
+        
+        parts = []
+        first_token_at = None
+        llm_completed = False
+        response_path = "llm"
+        llm_started = time.perf_counter()
+        try:
+            async with llm_gateway.slot() as deadline:
+                # The deadline covers opening the stream; tokens then flow as they come
+                stream = await asyncio.wait_for(self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._build_messages(user_message, intent, data, conversation_history, summary),
+                    max_tokens=500,
+                    temperature=0.7,
+                    stream=True
+                ), deadline)
+                async for chunk in stream:
+                    # Groq sends the token usage with the final chunk
+                    record_llm_usage("stream", getattr(getattr(chunk, "x_groq", None), "usage", None))
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if not content:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(content)
+                    yield {"event": "token", "content": content}
+            llm_completed = True
+        except (LLMUnavailable, asyncio.TimeoutError) as e:
+            logger.warning(f"Streaming {intent} answer from its template: {str(e) or 'deadline expired'}")
+            response_path = "template"
+            fallback = self._fallback_response(intent, data)
+            first_token_at = time.perf_counter()
+            parts.append(fallback)
+            yield {"event": "token", "content": fallback}
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {e}")
+            if not parts:
+                response_path = "template"
+                fallback = self._fallback_response(intent, data)
+                first_token_at = time.perf_counter()
+                parts.append(fallback)
+                yield {"event": "token", "content": fallback}
+        
+        response = "".join(parts).strip()
+        if llm_completed:
+            llm_call_seconds.observe(time.perf_counter() - llm_started, purpose="stream")
+            self._cache_response(intent, data, user_message, response, time.perf_counter() - llm_started)
+        
+        yield {
+            "event": "done",
+            "intent": intent,
+            "response": response,
+            "metadata": {
+                "model": self.model,
+                **self._route_metadata(route),
+                "streamed": True,
+                "cache_hit": False,
+                **self._policy_metadata(policy, response_path),
+                "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+                "total_time_ms": round((time.perf_counter() - started) * 1000, 1)
             }
         }
     
-    def _generate_llm_response(self, user_message: str, intent: str, data: Dict, conversation_history: List[Dict]) -> str:
-        """Generate response using LLM"""
+    def _build_messages(self, user_message: str, intent: str, data: Dict, conversation_history: List[Dict],
+                        summary: Optional[str] = None) -> List[Dict[str, str]]:
+        """Chat-completion messages for a turn"""
         
-        # Build context from conversation history
-        context = self._build_context(conversation_history)
+        # Build context from the rolling summary and as many recent turns as fit the budget
+        context, usage = build_context(conversation_history, summary)
         
         # Build system prompt
         system_prompt = self._build_system_prompt(intent, data)
@@ -149,48 +614,75 @@ class LLMService:
         # Build user prompt
         user_prompt = f"User message: {user_message}\n\nPlease provide a helpful and informative response."
         
-        try:
-            # Generate response using Groq
-            response = self.client.chat.completions.create(
+        system_tokens = estimate_tokens(system_prompt)
+        user_tokens = estimate_tokens(user_prompt)
+        context_tokens = usage["summary_tokens"] + usage["history_tokens"]
+        logger.info(
+            f"Prompt tokens ({intent}): total={system_tokens + context_tokens + user_tokens} "
+            f"system={system_tokens} summary={usage['summary_tokens']} history={usage['history_tokens']} "
+            f"({usage['messages']} messages, {usage['dropped']} over budget) user={user_tokens}"
+        )
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": context + "\n\n" + user_prompt}
+        ]
+    
+    async def summarize_conversation(self, summary: Optional[str], messages: List[Dict]) -> str:
+        """Fold ``messages`` (oldest first) into a conversation's rolling summary"""
+        transcript, _ = build_context(messages, budget=SUMMARY_INPUT_TOKENS)
+        
+        async def call():
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context + "\n\n" + user_prompt}
+                    {"role": "system", "content": (
+                        "You maintain a running summary of a customer support conversation. "
+                        f"Merge the new messages into the summary in at most {SUMMARY_TOKEN_BUDGET // 2} words. "
+                        "Keep order ids, product names and open questions; drop pleasantries."
+                    )},
+                    {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
                 ],
-                max_tokens=500,
-                temperature=0.7
+                max_tokens=SUMMARY_TOKEN_BUDGET,
+                temperature=0.2
             )
-            
+            llm_call_seconds.observe(time.perf_counter() - started, purpose="summary")
+            record_llm_usage("summary", response.usage)
+            return response
+        
+        try:
+            response = await llm_gateway.call(call, use_deadline=False)
             return response.choices[0].message.content.strip()
-            
         except Exception as e:
-            logger.error(f"Error generating LLM response: {e}")
-            return self._fallback_response(intent, data)
-    
-    def _build_context(self, conversation_history: List[Dict]) -> str:
-        """Build context from conversation history"""
-        if not conversation_history:
-            return ""
-        
-        context = "Previous conversation:\n"
-        for msg in conversation_history[-5:]:  # Last 5 messages
-            role = "User" if msg.get("is_user_message") else "Assistant"
-            context += f"{role}: {msg.get('content', '')}\n"
-        
-        return context
+            logger.warning(f"Could not summarize conversation with the LLM: {e}")
+        
+        # Without the LLM, keep what the user asked, newest questions first to survive
+        lines = ([summary] if summary else []) + [
+            f"User asked: {msg['content']}" for msg in messages if msg.get("is_user_message")
+        ]
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_TOKEN_BUDGET:
+            lines.pop(0)
+        return truncate_to_tokens("\n".join(lines), SUMMARY_TOKEN_BUDGET)
     
     def _build_system_prompt(self, intent: str, data: Dict) -> str:
-        """Build system prompt based on intent and data"""
+        """Build system prompt from the data of every intent served this turn"""
         
         base_prompt = """You are a helpful customer support assistant for an e-commerce clothing store. 
         You have access to product information, order status, and inventory data. 
         Be friendly, professional, and provide accurate information based on the available data."""
         
+        sections = [self._prompt_section(served, data) for served in self._served_intents(intent, data)]
+        return "\n\n".join([base_prompt] + [section for section in sections if section])
+    
+    def _prompt_section(self, intent: str, data: Dict) -> Optional[str]:
+        """System prompt section for one intent"""
+        
         if intent == "top_products":
             products = data.get("top_products", [])
             if products:
                 product_list = "\n".join([f"{i+1}. {p['name']}: {p['count']} units" for i, p in enumerate(products)])
-                return f"{base_prompt}\n\nTop selling products data:\n{product_list}\n\nProvide a clear list of the top products with their sales numbers."
+                return f"Top selling products data:\n{product_list}\n\nProvide a clear list of the top products with their sales numbers."
         
         elif intent == "order_status":
             order = data.get("order")
@@ -206,37 +698,52 @@ class LLMService:
                 if order.get('delivered_at'):
                     order_info += f"Delivered: {order['delivered_at']}\n"
                 
-                return f"{base_prompt}\n\nOrder information:\n{order_info}\n\nProvide a clear status update for this order."
+                return f"Order information:\n{order_info}\n\nProvide a clear status update for this order."
             elif data.get("error"):
-                return f"{base_prompt}\n\nError: {data['error']}\n\nAsk the user to provide a valid order ID."
+                return f"Error: {data['error']}\n\nAsk the user to provide a valid order ID."
         
         elif intent == "inventory":
             inventory = data.get("inventory")
             if inventory:
                 inventory_info = f"""
                 Product: {inventory['product_name']}
+                Matching products: {inventory.get('matched_products', 1)}
                 Total items: {inventory['total_items']}
                 Available in stock: {inventory['available_items']}
                 Sold items: {inventory['sold_items']}
                 """
-                return f"{base_prompt}\n\nInventory information:\n{inventory_info}\n\nProvide a clear inventory status for this product."
+                products = inventory.get("products", [])
+                if products:
+                    inventory_info += "Per product (most available first):\n" + "\n".join(
+                        f"- {p['product_name']}: {p['available_items']} available of {p['total_items']}"
+                        for p in products
+                    ) + "\n"
+                centers = inventory.get("distribution_centers", [])
+                if centers:
+                    inventory_info += "Per distribution center:\n" + "\n".join(
+                        f"- {c['name'] or c['distribution_center_id']}: {c['available_items']} available"
+                        for c in centers
+                    ) + "\n"
+                return f"Inventory information:\n{inventory_info}\n\nProvide a clear inventory status for this product."
             elif data.get("error"):
-                return f"{base_prompt}\n\nError: {data['error']}\n\nAsk the user to specify a product name."
+                return f"Error: {data['error']}\n\nAsk the user to specify a product name."
         
         elif intent == "help":
-            return f"""{base_prompt}
-            
-            You can help with:
+            return """You can help with:
             1. Product information and top sellers
             2. Order status and tracking (provide order ID)
             3. Inventory and stock levels (specify product name)
             
             Ask clarifying questions if you need more information from the user."""
         
-        return base_prompt
+        return None
     
     def _fallback_response(self, intent: str, data: Dict) -> str:
-        """Provide fallback response when LLM fails"""
+        """Answer formatted from the data alone (template path, or when the LLM fails)"""
+        return "\n".join(self._fallback_section(served, data) for served in self._served_intents(intent, data))
+    
+    def _fallback_section(self, intent: str, data: Dict) -> str:
+        """Template answer for one intent"""
         
         if intent == "top_products":
             products = data.get("top_products", [])
@@ -267,6 +774,11 @@ class LLMService:
                 response += f"Available in stock: {inventory['available_items']} items\n"
                 response += f"Total items: {inventory['total_items']}\n"
                 response += f"Sold items: {inventory['sold_items']}\n"
+                products = inventory.get("products", [])
+                if len(products) > 1:
+                    response += "By product:\n"
+                    for product in products:
+                        response += f"- {product['product_name']}: {product['available_items']} available\n"
                 return response
             return "I can help you check inventory levels. Please specify a product name."
         
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Groq's chat-completions API, for offline load tests.
+
+Serves ``POST /openai/v1/chat/completions`` (the path the Groq SDK calls),
+streaming included, so the backend runs against it with
+``LLM_BACKEND=stub`` (and ``LLM_BASE_URL`` if it is not on port 8001):
+
+    python llm_stub_server.py --port 8001 --latency-ms 350 --tokens-per-second 300 --error-rate 0.01
+
+Each call waits a time-to-first-token drawn from a log-normal distribution
+(median ``--latency-ms``, spread ``--latency-sigma``), then produces its
+completion tokens at ``--tokens-per-second``. Errors are injected at the
+given rates: 500s, 429s with ``retry-after``, and calls that hang for
+``--hang-seconds`` to exercise client deadlines. Answers are stitched
+together from the prompt's own words, so their length and shape are
+plausible. ``GET /stats`` reports what was served.
+"""
+
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import logging
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Groq chat-completions stub")
+
+# Replaced from the command line in main()
+settings: Dict[str, Any] = {
+    "latency_ms": 350.0,
+    "latency_sigma": 0.5,
+    "tokens_per_second": 300.0,
+    "completion_tokens": 120,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "hang_rate": 0.0,
+    "hang_seconds": 60.0,
+}
+rng = random.Random()
+stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0, "hung": 0, "completion_tokens": 0}
+
+def _words(messages: List[Dict[str, str]]) -> List[str]:
+    text = " ".join(message.get("content") or "" for message in messages)
+    return [word for word in text.split() if word.isprintable()] or ["OK"]
+
+def _completion(messages: List[Dict[str, str]], max_tokens: int) -> List[str]:
+    """Completion tokens (one per word) drawn from the prompt"""
+    words = _words(messages)
+    count = max(1, min(max_tokens, int(rng.gauss(settings["completion_tokens"], settings["completion_tokens"] / 4))))
+    start = rng.randrange(len(words))
+    return [words[(start + i) % len(words)] for i in range(count)]
+
+def _time_to_first_token() -> float:
+    return rng.lognormvariate(0, settings["latency_sigma"]) * settings["latency_ms"] / 1000
+
+def _error(status: int, message: str, error_type: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": error_type}}, status_code=status, headers=headers)
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "stub")
+    stats["requests"] += 1
+
+    roll = rng.random()
+    if roll < settings["error_rate"]:
+        stats["errors"] += 1
+        return _error(500, "Injected server error", "internal_server_error")
+    roll -= settings["error_rate"]
+    if roll < settings["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return _error(429, "Injected rate limit", "rate_limit_exceeded", {"retry-after": "1"})
+    roll -= settings["rate_limit_rate"]
+    if roll < settings["hang_rate"]:
+        stats["hung"] += 1
+        await asyncio.sleep(settings["hang_seconds"])
+
+    tokens = _completion(messages, int(body.get("max_tokens") or 500))
+    prompt_tokens = len(_words(messages))
+    stats["completion_tokens"] += len(tokens)
+    completion_id = f"chatcmpl-{uuid.uuid4()}"
+    created = int(time.time())
+    seconds_per_token = 1 / settings["tokens_per_second"]
+    await asyncio.sleep(_time_to_first_token())
+
+    if not body.get("stream"):
+        await asyncio.sleep(len(tokens) * seconds_per_token)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt_tokens, len(tokens)),
+        }
+
+    stats["streamed"] += 1
+
+    async def chunks():
+        def chunk(delta: Dict[str, Any], finish_reason=None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(seconds_per_token)
+            yield chunk({"content": token if i == 0 else " " + token})
+        yield chunk({}, "stop", x_groq={"id": completion_id, "usage": _usage(prompt_tokens, len(tokens))})
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "settings": settings}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stub of Groq's chat-completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=350, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Spread of the log-normal time to first token (0 = fixed)")
+    parser.add_argument("--tokens-per-second", type=float, default=300, help="Completion token rate")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="Mean completion length in tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with a 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of calls that stall first")
+    parser.add_argument("--hang-seconds", type=float, default=60, help="How long a stalled call stalls")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latencies and errors")
+    args = parser.parse_args(argv)
+
+    settings.update({
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "tokens_per_second": args.tokens_per_second,
+        "completion_tokens": args.completion_tokens,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "hang_rate": args.hang_rate,
+        "hang_seconds": args.hang_seconds,
+    })
+    if args.seed is not None:
+        rng.seed(args.seed)
+    logger.info(f"Stub LLM on http://{args.host}:{args.port} with {settings}")
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
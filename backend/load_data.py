@@ -1,236 +1,407 @@
-import pandas as pd
+import argparse
+import csv
+import hashlib
+import io
 import os
-from sqlalchemy.orm import Session
-from database import SessionLocal, create_tables
+import sys
+import tempfile
+import time
+import logging
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import Integer, Float, DateTime, create_engine, select, text
+from sqlalchemy.engine import Connection
+
+from database import DATABASE_URL, engine, create_tables
 from models import (
-    User, EcommerceUser, Product, DistributionCenter, InventoryItem, 
-    Order, OrderItem, Base
+    EcommerceUser, Product, DistributionCenter, InventoryItem,
+    Order, OrderItem, LoadCheckpoint
 )
-from datetime import datetime
-import logging
+from sales_rollup import refresh_sales_rollup, affected_product_ids
+from data_cache import bump_data_version
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_datetime(date_str):
-    """Parse datetime string to datetime object"""
-    if pd.isna(date_str) or date_str == '':
-        return None
+# Rows per multi-row INSERT statement
+DEFAULT_BATCH_SIZE = 5000
+
+# Rows read from a CSV, cleaned and committed at a time; bounds peak memory
+DEFAULT_CHUNK_ROWS = 50000
+
+# CSV file and target model for each table, in an order that respects foreign keys
+TABLE_SPECS = [
+    {"csv": "distribution_centers.csv", "model": DistributionCenter},
+    {"csv": "products.csv", "model": Product},
+    {"csv": "users.csv", "model": EcommerceUser},
+    {"csv": "inventory_items.csv", "model": InventoryItem},
+    {"csv": "orders.csv", "model": Order},
+    {"csv": "order_items.csv", "model": OrderItem},
+]
+
+def parse_datetime_column(column: pd.Series) -> pd.Series:
+    """Parse a whole column of datetime strings into naive UTC datetimes (NaT for blanks)"""
+    parsed = pd.to_datetime(column, errors="coerce", utc=True)
+    return parsed.dt.tz_localize(None)
+
+def clean_frame(df: pd.DataFrame, model) -> pd.DataFrame:
+    """Vectorized cleanup of a raw CSV frame for insertion into ``model``'s table.
+
+    Drops columns the table does not have, coerces each column to the type of
+    its model column and turns every NaN/NaT into ``None`` so it becomes NULL.
+    """
+    columns = [c for c in model.__table__.columns if c.name in df.columns]
+    cleaned = {}
+    for column in columns:
+        values = df[column.name]
+        if isinstance(column.type, DateTime):
+            parsed = parse_datetime_column(values)
+            values = pd.Series(parsed.dt.to_pydatetime(), index=parsed.index, dtype=object)
+        elif isinstance(column.type, Integer):
+            values = pd.to_numeric(values, errors="coerce").astype("Int64")
+        elif isinstance(column.type, Float):
+            values = pd.to_numeric(values, errors="coerce")
+        else:
+            values = values.astype("string")
+        cleaned[column.name] = values
+
+    frame = pd.DataFrame(cleaned).astype(object)
+    return frame.where(frame.notna(), None)
+
+def iter_chunks(path: str, model, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """Stream a CSV as cleaned frames of at most ``chunk_rows`` rows.
+
+    Only the columns the table needs are parsed. A ``chunk_rows`` of 0 reads the
+    whole file as a single chunk.
+    """
+    table_columns = {c.name for c in model.__table__.columns}
+    usecols = lambda name: name in table_columns
+    if not chunk_rows:
+        yield clean_frame(pd.read_csv(path, usecols=usecols), model)
+        return
+    for df in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        yield clean_frame(df, model)
+
+def plan_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """Split a CSV into byte ranges of at most ``chunk_rows`` records.
+
+    Returns the header and a list of ``(offset, length, rows)`` tuples. Ranges
+    always end on a record boundary, never inside a quoted multi-line field, so
+    each one can be parsed independently (e.g. in another process).
+    """
+    chunks = []
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+        start = offset = f.tell()
+        rows = 0
+        in_quotes = False
+        for line in f:
+            offset += len(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if in_quotes:
+                continue
+            rows += 1
+            if chunk_rows and rows == chunk_rows:
+                chunks.append((start, offset - start, rows))
+                start = offset
+                rows = 0
+        if offset > start:
+            chunks.append((start, offset - start, rows))
+    return header, chunks
+
+def read_chunk_bytes(path: str, chunk: tuple) -> bytes:
+    """Raw CSV bytes of one range produced by ``plan_chunks``"""
+    offset, length, _ = chunk
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+def parse_chunk_bytes(data: bytes, model, header: list) -> pd.DataFrame:
+    """Parse and clean the raw bytes of one chunk"""
+    table_columns = {c.name for c in model.__table__.columns}
+    df = pd.read_csv(io.BytesIO(data), header=None, names=header,
+                     usecols=lambda name: name in table_columns)
+    return clean_frame(df, model)
+
+def read_chunk(path: str, model, header: list, chunk: tuple) -> pd.DataFrame:
+    """Read and clean one byte range produced by ``plan_chunks``"""
+    return parse_chunk_bytes(read_chunk_bytes(path, chunk), model, header)
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, or None where it is not available (Windows)"""
     try:
-        return pd.to_datetime(date_str)
-    except:
+        import resource
+    except ImportError:
         return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
 
-def load_distribution_centers(db: Session, data_dir: str):
-    """Load distribution centers data"""
-    try:
-        df = pd.read_csv(os.path.join(data_dir, 'distribution_centers.csv'))
-        logger.info(f"Loading {len(df)} distribution centers")
-        
-        for _, row in df.iterrows():
-            center = DistributionCenter(
-                id=row['id'],
-                name=row['name'] if pd.notna(row['name']) else None,
-                latitude=row['latitude'] if pd.notna(row['latitude']) else None,
-                longitude=row['longitude'] if pd.notna(row['longitude']) else None
-            )
-            db.add(center)
-        
-        db.commit()
-        logger.info("Distribution centers loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading distribution centers: {e}")
-        db.rollback()
-
-def load_products(db: Session, data_dir: str):
-    """Load products data"""
-    try:
-        df = pd.read_csv(os.path.join(data_dir, 'products.csv'))
-        logger.info(f"Loading {len(df)} products")
-        
-        for _, row in df.iterrows():
-            product = Product(
-                id=row['id'],
-                cost=row['cost'] if pd.notna(row['cost']) else None,
-                category=row['category'] if pd.notna(row['category']) else None,
-                name=row['name'] if pd.notna(row['name']) else None,
-                brand=row['brand'] if pd.notna(row['brand']) else None,
-                retail_price=row['retail_price'] if pd.notna(row['retail_price']) else None,
-                department=row['department'] if pd.notna(row['department']) else None,
-                sku=row['sku'] if pd.notna(row['sku']) else None,
-                distribution_center_id=row['distribution_center_id'] if pd.notna(row['distribution_center_id']) else None
-            )
-            db.add(product)
-        
-        db.commit()
-        logger.info("Products loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading products: {e}")
-        db.rollback()
-
-def load_ecommerce_users(db: Session, data_dir: str):
-    """Load users data"""
-    try:
-        df = pd.read_csv(os.path.join(data_dir, 'users.csv'))
-        logger.info(f"Loading {len(df)} users")
-        
-        for _, row in df.iterrows():
-            user = EcommerceUser(
-                id=row['id'],
-                first_name=row['first_name'] if pd.notna(row['first_name']) else None,
-                last_name=row['last_name'] if pd.notna(row['last_name']) else None,
-                email=row['email'] if pd.notna(row['email']) else None,
-                age=row['age'] if pd.notna(row['age']) else None,
-                gender=row['gender'] if pd.notna(row['gender']) else None,
-                state=row['state'] if pd.notna(row['state']) else None,
-                street_address=row['street_address'] if pd.notna(row['street_address']) else None,
-                postal_code=row['postal_code'] if pd.notna(row['postal_code']) else None,
-                city=row['city'] if pd.notna(row['city']) else None,
-                country=row['country'] if pd.notna(row['country']) else None,
-                latitude=row['latitude'] if pd.notna(row['latitude']) else None,
-                longitude=row['longitude'] if pd.notna(row['longitude']) else None,
-                traffic_source=row['traffic_source'] if pd.notna(row['traffic_source']) else None,
-                created_at=parse_datetime(row['created_at']) if pd.notna(row['created_at']) else None
-            )
-            db.add(user)
-        
-        db.commit()
-        logger.info("Users loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading users: {e}")
-        db.rollback()
-
-def load_inventory_items(db: Session, data_dir: str):
-    """Load inventory items data"""
-    try:
-        df = pd.read_csv(os.path.join(data_dir, 'inventory_items.csv'))
-        logger.info(f"Loading {len(df)} inventory items")
-        
-        for _, row in df.iterrows():
-            inventory_item = InventoryItem(
-                id=row['id'],
-                product_id=row['product_id'] if pd.notna(row['product_id']) else None,
-                created_at=parse_datetime(row['created_at']) if pd.notna(row['created_at']) else None,
-                sold_at=parse_datetime(row['sold_at']) if pd.notna(row['sold_at']) else None,
-                cost=row['cost'] if pd.notna(row['cost']) else None,
-                product_category=row['product_category'] if pd.notna(row['product_category']) else None,
-                product_name=row['product_name'] if pd.notna(row['product_name']) else None,
-                product_brand=row['product_brand'] if pd.notna(row['product_brand']) else None,
-                product_retail_price=row['product_retail_price'] if pd.notna(row['product_retail_price']) else None,
-                product_department=row['product_department'] if pd.notna(row['product_department']) else None,
-                product_sku=row['product_sku'] if pd.notna(row['product_sku']) else None,
-                product_distribution_center_id=row['product_distribution_center_id'] if pd.notna(row['product_distribution_center_id']) else None
-            )
-            db.add(inventory_item)
-        
-        db.commit()
-        logger.info("Inventory items loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading inventory items: {e}")
-        db.rollback()
-
-def load_orders(db: Session, data_dir: str):
-    """Load orders data"""
-    try:
-        df = pd.read_csv(os.path.join(data_dir, 'orders.csv'))
-        logger.info(f"Loading {len(df)} orders")
-        
-        for _, row in df.iterrows():
-            order = Order(
-                order_id=row['order_id'],
-                user_id=row['user_id'] if pd.notna(row['user_id']) else None,
-                status=row['status'] if pd.notna(row['status']) else None,
-                gender=row['gender'] if pd.notna(row['gender']) else None,
-                created_at=parse_datetime(row['created_at']) if pd.notna(row['created_at']) else None,
-                returned_at=parse_datetime(row['returned_at']) if pd.notna(row['returned_at']) else None,
-                shipped_at=parse_datetime(row['shipped_at']) if pd.notna(row['shipped_at']) else None,
-                delivered_at=parse_datetime(row['delivered_at']) if pd.notna(row['delivered_at']) else None,
-                num_of_item=row['num_of_item'] if pd.notna(row['num_of_item']) else None
-            )
-            db.add(order)
-        
-        db.commit()
-        logger.info("Orders loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading orders: {e}")
-        db.rollback()
-
-def load_order_items(db: Session, data_dir: str):
-    """Load order items data"""
+def insert_rows(conn: Connection, model, frame: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Insert a cleaned frame with chunked executemany multi-row inserts"""
+    table = model.__table__
+    records = frame.to_dict("records")
+    for start in range(0, len(records), batch_size):
+        conn.execute(table.insert(), records[start:start + batch_size])
+    return len(records)
+
+def upsert_rows(conn: Connection, model, frame: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Insert a cleaned frame, updating rows whose primary key already exists.
+
+    Uses ``INSERT ... ON DUPLICATE KEY UPDATE`` on MySQL and
+    ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite.
+    """
+    table = model.__table__
+    records = frame.to_dict("records")
+    if not records:
+        return 0
+    update_columns = [c for c in frame.columns if not table.c[c].primary_key]
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key.columns],
+            set_={c: stmt.excluded[c] for c in update_columns},
+        )
+    else:
+        raise ValueError(f"Upserts are not supported for the {dialect} dialect")
+    for start in range(0, len(records), batch_size):
+        conn.execute(stmt, records[start:start + batch_size])
+    return len(records)
+
+# Written for missing values, then swapped for \N; the csv writer would escape
+# a \N given as na_rep into \\N, which LOAD DATA reads as the string "\N"
+INFILE_NULL_SENTINEL = "__load_data_null_7f3c9a__"
+
+def write_infile_csv(frame: pd.DataFrame, path: str) -> None:
+    """Write a frame as a ``LOAD DATA`` file: backslash-escaped values and bare ``\\N`` for NULL"""
+    content = frame.to_csv(index=False, header=False, na_rep=INFILE_NULL_SENTINEL,
+                           date_format="%Y-%m-%d %H:%M:%S", escapechar="\\", lineterminator="\n")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(content.replace(INFILE_NULL_SENTINEL, "\\N"))
+
+def load_data_infile(conn: Connection, model, frame: pd.DataFrame) -> int:
+    """Insert a cleaned frame with MySQL ``LOAD DATA LOCAL INFILE``"""
+    table = model.__table__
+    columns = list(frame.columns)
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
     try:
-        df = pd.read_csv(os.path.join(data_dir, 'order_items.csv'))
-        logger.info(f"Loading {len(df)} order items")
-        
-        for _, row in df.iterrows():
-            order_item = OrderItem(
-                id=row['id'],
-                order_id=row['order_id'] if pd.notna(row['order_id']) else None,
-                user_id=row['user_id'] if pd.notna(row['user_id']) else None,
-                product_id=row['product_id'] if pd.notna(row['product_id']) else None,
-                inventory_item_id=row['inventory_item_id'] if pd.notna(row['inventory_item_id']) else None,
-                status=row['status'] if pd.notna(row['status']) else None,
-                created_at=parse_datetime(row['created_at']) if pd.notna(row['created_at']) else None,
-                shipped_at=parse_datetime(row['shipped_at']) if pd.notna(row['shipped_at']) else None,
-                delivered_at=parse_datetime(row['delivered_at']) if pd.notna(row['delivered_at']) else None,
-                returned_at=parse_datetime(row['returned_at']) if pd.notna(row['returned_at']) else None
+        write_infile_csv(frame, path)
+        column_list = ", ".join(f"`{c}`" for c in columns)
+        conn.execute(text(
+            f"LOAD DATA LOCAL INFILE :path INTO TABLE `{table.name}` "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({column_list})"
+        ), {"path": path})
+    finally:
+        os.remove(path)
+    return len(frame)
+
+def create_infile_engine():
+    """Engine whose connections are allowed to send local files to the server"""
+    if not DATABASE_URL.startswith("mysql"):
+        raise ValueError("LOAD DATA LOCAL INFILE is only supported for MySQL databases")
+    return create_engine(DATABASE_URL, connect_args={"local_infile": True})
+
+def load_table(spec: dict, data_dir: str, target_engine=None, batch_size: int = DEFAULT_BATCH_SIZE,
+               use_infile: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> dict:
+    """Stream one CSV into its table, committing each chunk, and return row count and throughput"""
+    model = spec["model"]
+    table_name = model.__tablename__
+    target_engine = target_engine or engine
+    started = time.perf_counter()
+    logger.info(f"Loading {spec['csv']} into {table_name}")
+
+    rows = 0
+    for chunk in iter_chunks(os.path.join(data_dir, spec["csv"]), model, chunk_rows):
+        with target_engine.begin() as conn:
+            if use_infile:
+                rows += load_data_infile(conn, model, chunk)
+            else:
+                rows += insert_rows(conn, model, chunk, batch_size)
+        logger.debug(f"Committed {rows} rows into {table_name}")
+
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    logger.info(f"Loaded {rows} rows into {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return {"table": table_name, "rows": rows, "seconds": elapsed, "rows_per_sec": rate}
+
+def load_table_incremental(spec: dict, data_dir: str, target_engine=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                           chunk_rows: int = DEFAULT_CHUNK_ROWS) -> dict:
+    """Upsert only the chunks of a CSV that changed since the last committed load.
+
+    Each chunk's byte range, content hash and last id are checkpointed in
+    ``load_checkpoints`` in the same transaction as its rows, so an
+    interrupted run resumes from the last committed chunk and a re-run over an
+    unchanged file writes nothing. A chunk is skipped when its content hash
+    matches the checkpoint of the same chunk index; its byte offset may
+    differ, since an edit to an earlier row shifts every later range.
+    """
+    model = spec["model"]
+    table = model.__table__
+    table_name = table.name
+    target_engine = target_engine or engine
+    checkpoints = LoadCheckpoint.__table__
+    pk_column = list(table.primary_key.columns)[0].name
+    started = time.perf_counter()
+
+    path = os.path.join(data_dir, spec["csv"])
+    header, chunks = plan_chunks(path, chunk_rows)
+    with target_engine.connect() as conn:
+        stored = {
+            row.chunk_index: row for row in conn.execute(
+                select(checkpoints).where(checkpoints.c.table_name == table_name)
             )
-            db.add(order_item)
-        
-        db.commit()
-        logger.info("Order items loaded successfully")
-    except Exception as e:
-        logger.error(f"Error loading order items: {e}")
-        db.rollback()
-
-def main():
+        }
+    logger.info(f"Incremental load of {spec['csv']} into {table_name} "
+                f"({len(chunks)} chunks, {len(stored)} checkpointed)")
+
+    rows = skipped = 0
+    for index, chunk in enumerate(chunks):
+        data = read_chunk_bytes(path, chunk)
+        content_hash = hashlib.sha256(data).hexdigest()
+        previous = stored.get(index)
+        # Same bytes means same rows, even if an earlier edit shifted the offset
+        if previous is not None and previous.content_hash == content_hash:
+            skipped += 1
+            continue
+
+        frame = parse_chunk_bytes(data, model, header)
+        last_id = frame[pk_column].max() if len(frame) else None
+        with target_engine.begin() as conn:
+            product_ids = affected_product_ids(conn, model, frame)
+            rows += upsert_rows(conn, model, frame, batch_size)
+            if product_ids:
+                refresh_sales_rollup(conn, product_ids)
+            conn.execute(checkpoints.delete().where(
+                checkpoints.c.table_name == table_name, checkpoints.c.chunk_index == index))
+            conn.execute(checkpoints.insert().values(
+                table_name=table_name, chunk_index=index, byte_offset=chunk[0], byte_length=chunk[1],
+                row_count=chunk[2], last_id=last_id, content_hash=content_hash, loaded_at=datetime.now(),
+            ))
+            bump_data_version(conn)
+
+    # The file shrank: forget checkpoints for chunks that no longer exist
+    with target_engine.begin() as conn:
+        conn.execute(checkpoints.delete().where(
+            checkpoints.c.table_name == table_name, checkpoints.c.chunk_index >= len(chunks)))
+
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    logger.info(f"Upserted {rows} rows into {table_name} ({skipped}/{len(chunks)} chunks unchanged) "
+                f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return {"table": table_name, "rows": rows, "seconds": elapsed, "rows_per_sec": rate}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load the e-commerce CSV dataset into the database")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the CSV files")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Rows per multi-row INSERT statement")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Rows read and committed per chunk (0 reads each file whole)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Upsert only chunks that changed since the last load, resuming from "
+                             "the last committed chunk")
+    parser.add_argument("--refresh-rollup", action="store_true",
+                        help="Only rebuild the product sales rollup from the loaded order items")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Parse in a process pool, load independent tables concurrently and "
+                             "defer FK checks and secondary indexes until the end")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Parser processes used by --parallel")
+    parser.add_argument("--infile", action="store_true",
+                        help="Use MySQL LOAD DATA LOCAL INFILE instead of INSERT statements")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to load all data"""
-    data_dir = "data"
-    
+    args = parse_args(argv)
+    data_dir = args.data_dir
+
+    if args.refresh_rollup:
+        create_tables()
+        with engine.begin() as conn:
+            refresh_sales_rollup(conn)
+            bump_data_version(conn)
+        return
+
     if not os.path.exists(data_dir):
         logger.error(f"Data directory '{data_dir}' not found!")
         logger.info("Please download the dataset and extract CSV files to the 'data' directory")
         return
-    
+
     # Check if required files exist
-    required_files = [
-        'distribution_centers.csv',
-        'products.csv', 
-        'users.csv',
-        'inventory_items.csv',
-        'orders.csv',
-        'order_items.csv'
-    ]
-    
+    required_files = [spec["csv"] for spec in TABLE_SPECS]
+
     missing_files = [f for f in required_files if not os.path.exists(os.path.join(data_dir, f))]
     if missing_files:
         logger.error(f"Missing required files: {missing_files}")
         return
-    
+
     # Create tables
     logger.info("Creating database tables...")
     create_tables()
-    
+
+    if args.incremental and (args.parallel or args.infile):
+        logger.error("--incremental cannot be combined with --parallel or --infile")
+        return
+
+    target_engine = create_infile_engine() if args.infile else engine
+
     # Load data
-    db = SessionLocal()
-    try:
-        logger.info("Starting data loading process...")
-        
+    logger.info("Starting data loading process...")
+    if args.parallel:
+        from load_scheduler import load_parallel
+        results = load_parallel(TABLE_SPECS, data_dir, target_engine, args.workers,
+                                args.batch_size, args.infile, args.chunk_rows)
+    else:
+        results = []
         # Load in order to respect foreign key constraints
-        load_distribution_centers(db, data_dir)
-        load_products(db, data_dir)
-        load_ecommerce_users(db, data_dir)
-        load_inventory_items(db, data_dir)
-        load_orders(db, data_dir)
-        load_order_items(db, data_dir)
-        
+        for spec in TABLE_SPECS:
+            try:
+                if args.incremental:
+                    results.append(load_table_incremental(spec, data_dir, target_engine,
+                                                          args.batch_size, args.chunk_rows))
+                else:
+                    results.append(load_table(spec, data_dir, target_engine, args.batch_size,
+                                              args.infile, args.chunk_rows))
+            except Exception as e:
+                logger.error(f"Error loading {spec['model'].__tablename__}: {e}")
+                if args.incremental:
+                    logger.error("Stopping; re-run with --incremental to resume from the last committed chunk")
+                    break
+
+    if not args.incremental and results:
+        with engine.begin() as conn:
+            if len(results) == len(TABLE_SPECS):
+                refresh_sales_rollup(conn)
+            # Tell running API servers to drop their cached lookups
+            bump_data_version(conn)
+
+    total_rows = sum(r["rows"] for r in results)
+    total_seconds = sum(r["seconds"] for r in results)
+    logger.info("Load summary:")
+    for r in results:
+        logger.info(f"  {r['table']:<22} {r['rows']:>10} rows {r['seconds']:>8.2f}s {r['rows_per_sec']:>12,.0f} rows/sec")
+    if total_seconds > 0:
+        logger.info(f"  {'total':<22} {total_rows:>10} rows {total_seconds:>8.2f}s {total_rows / total_seconds:>12,.0f} rows/sec")
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        logger.info(f"Peak RSS: {peak_rss:.1f} MB")
+
+    if len(results) == len(TABLE_SPECS):
         logger.info("All data loaded successfully!")
-        
-    except Exception as e:
-        logger.error(f"Error during data loading: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
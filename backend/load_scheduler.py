@@ -0,0 +1,204 @@
+"""
+Parallel, dependency-aware dataset loading.
+
+Tables are scheduled along the foreign-key graph declared on the models
+(distribution_centers -> products -> inventory_items, ecommerce_users ->
+orders -> order_items): a table starts loading as soon as every table it
+references has finished, so independent tables load at the same time over
+separate connections. CSV chunks are parsed and cleaned in a process pool.
+
+While loading, foreign-key checks are disabled on the loader connections and
+secondary (non-PK) indexes are dropped; the indexes are rebuilt once at the end
+and a verification pass checks row counts and referential integrity.
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from load_data import plan_chunks, read_chunk, insert_rows, load_data_infile, DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_ROWS
+
+logger = logging.getLogger(__name__)
+
+def dependency_graph(specs: List[dict]) -> Dict[str, Set[str]]:
+    """Map each table to the tables (among ``specs``) its foreign keys reference"""
+    names = {spec["model"].__tablename__ for spec in specs}
+    graph = {}
+    for spec in specs:
+        table = spec["model"].__table__
+        graph[table.name] = {
+            fk.column.table.name for fk in table.foreign_keys
+            if fk.column.table.name in names and fk.column.table.name != table.name
+        }
+    return graph
+
+def set_fk_checks(conn: Connection, enabled: bool):
+    """Toggle foreign-key enforcement for this connection's session"""
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        conn.execute(text(f"SET FOREIGN_KEY_CHECKS = {1 if enabled else 0}"))
+    elif dialect == "sqlite":
+        conn.execute(text(f"PRAGMA foreign_keys = {'ON' if enabled else 'OFF'}"))
+    conn.commit()
+
+def drop_secondary_indexes(engine, specs: List[dict]) -> list:
+    """Drop the declared non-PK indexes of the tables being loaded; returns what was dropped"""
+    dropped = []
+    with engine.connect() as conn:
+        for spec in specs:
+            for index in spec["model"].__table__.indexes:
+                try:
+                    index.drop(bind=conn, checkfirst=True)
+                    conn.commit()
+                    dropped.append(index)
+                except Exception as e:
+                    # MySQL refuses to drop an index that backs a foreign key
+                    conn.rollback()
+                    logger.warning(f"Keeping index {index.name} during load: {e}")
+    return dropped
+
+def rebuild_indexes(engine, indexes: list):
+    """Recreate indexes dropped by ``drop_secondary_indexes``"""
+    with engine.connect() as conn:
+        for index in indexes:
+            started = time.perf_counter()
+            index.create(bind=conn, checkfirst=True)
+            conn.commit()
+            logger.info(f"Rebuilt index {index.name} in {time.perf_counter() - started:.2f}s")
+
+def verify_load(engine, specs: List[dict], results: List[dict]) -> List[str]:
+    """Check loaded row counts and look for rows whose foreign keys point nowhere"""
+    problems = []
+    loaded = {r["table"]: r["rows"] for r in results}
+    with engine.connect() as conn:
+        for spec in specs:
+            table = spec["model"].__table__
+            count = conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+            if table.name in loaded and count < loaded[table.name]:
+                problems.append(f"{table.name}: expected at least {loaded[table.name]} rows, found {count}")
+            for fk in table.foreign_keys:
+                parent = fk.column.table
+                orphans = conn.execute(text(
+                    f"SELECT COUNT(*) FROM {table.name} c "
+                    f"LEFT JOIN {parent.name} p ON c.{fk.parent.name} = p.{fk.column.name} "
+                    f"WHERE c.{fk.parent.name} IS NOT NULL AND p.{fk.column.name} IS NULL"
+                )).scalar()
+                if orphans:
+                    problems.append(f"{table.name}.{fk.parent.name}: {orphans} rows reference missing {parent.name}")
+    for problem in problems:
+        logger.warning(f"Verification: {problem}")
+    if not problems:
+        logger.info("Verification passed: row counts and foreign keys are consistent")
+    return problems
+
+def load_table_chunks(spec: dict, data_dir: str, pool: ProcessPoolExecutor, engine,
+                      batch_size: int, use_infile: bool, chunk_rows: int, max_pending: int) -> dict:
+    """Load one table on its own connection while the pool parses the next chunks"""
+    model = spec["model"]
+    table_name = model.__tablename__
+    path = os.path.join(data_dir, spec["csv"])
+    started = time.perf_counter()
+    header, chunks = plan_chunks(path, chunk_rows)
+    logger.info(f"Loading {spec['csv']} into {table_name} ({len(chunks)} chunks)")
+
+    rows = 0
+    remaining = iter(chunks)
+    # Bounded look-ahead keeps at most ``max_pending`` parsed chunks in memory
+    pending = deque(pool.submit(read_chunk, path, model, header, chunk)
+                    for _, chunk in zip(range(max_pending), remaining))
+    with engine.connect() as conn:
+        set_fk_checks(conn, False)
+        try:
+            while pending:
+                frame = pending.popleft().result()
+                chunk = next(remaining, None)
+                if chunk is not None:
+                    pending.append(pool.submit(read_chunk, path, model, header, chunk))
+                if use_infile:
+                    rows += load_data_infile(conn, model, frame)
+                else:
+                    rows += insert_rows(conn, model, frame, batch_size)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            try:
+                set_fk_checks(conn, True)
+            except Exception:
+                # Never hand a connection with FK checks off back to the pool
+                conn.invalidate()
+                raise
+
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    logger.info(f"Loaded {rows} rows into {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return {"table": table_name, "rows": rows, "seconds": elapsed, "rows_per_sec": rate}
+
+def load_parallel(specs: List[dict], data_dir: str, engine, workers: int,
+                  batch_size: int = DEFAULT_BATCH_SIZE, use_infile: bool = False,
+                  chunk_rows: int = DEFAULT_CHUNK_ROWS) -> List[dict]:
+    """Load all tables concurrently along the FK graph, then rebuild indexes and verify.
+
+    Indexes are rebuilt however the load ends; verification only runs when
+    every table loaded.
+    """
+    graph = dependency_graph(specs)
+    by_name = {spec["model"].__tablename__: spec for spec in specs}
+    done: Set[str] = set()
+    failed: Set[str] = set()
+    results = []
+
+    dropped = drop_secondary_indexes(engine, specs)
+    logger.info(f"Deferred {len(dropped)} secondary indexes until the load completes")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+                ThreadPoolExecutor(max_workers=len(specs)) as threads:
+            running = {}
+
+            def schedule_ready():
+                for name, deps in graph.items():
+                    if name in done or name in failed or name in running.values():
+                        continue
+                    if deps & failed:
+                        logger.error(f"Skipping {name}: depends on failed {sorted(deps & failed)}")
+                        failed.add(name)
+                        # Dependents of this table may already have been passed over
+                        return schedule_ready()
+                    if deps <= done:
+                        future = threads.submit(load_table_chunks, by_name[name], data_dir, pool, engine,
+                                                batch_size, use_infile, chunk_rows, workers * 2)
+                        running[future] = name
+
+            schedule_ready()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results.append(future.result())
+                        done.add(name)
+                    except Exception as e:
+                        logger.error(f"Error loading {name}: {e}")
+                        failed.add(name)
+                schedule_ready()
+    finally:
+        # Put the indexes back even if the load was interrupted
+        rebuild_indexes(engine, dropped)
+
+    if failed:
+        logger.error(f"Skipping verification: {sorted(failed)} did not load")
+    else:
+        verify_load(engine, specs, results)
+    # Report in the canonical table order rather than completion order
+    order = list(by_name)
+    return sorted(results, key=lambda r: order.index(r["table"]))
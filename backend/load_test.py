@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat API.
+
+Replays a mix of customer traffic against a running backend and reports, per
+endpoint, the request count, errors, requests/sec and p50/p95/p99 latency:
+
+    python load_test.py --base-url http://127.0.0.1:8000 --concurrency 20 --duration 60
+
+Questions use real order ids and product names sampled from the database in
+``DATABASE_URL``, so lookups hit real rows. Each virtual user keeps a
+conversation for ``--turns-per-conversation`` turns, so follow-up questions
+carry history like real sessions do. Streaming requests also report their
+time to first token.
+
+For a fully offline run, point the backend at the Groq stub
+(``LLM_BACKEND=stub``, see ``llm_stub_server.py``) and a local MySQL or
+SQLite database; the README has the full recipe.
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Order, Product
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+# One line per request would drown the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Scenario -> share of the traffic
+SCENARIO_WEIGHTS = {
+    "order_status": 30,
+    "inventory": 25,
+    "top_products": 10,
+    "help": 5,
+    "multi_intent": 5,
+    "general": 5,
+    "stream": 10,
+    "list_conversations": 5,
+    "message_page": 5,
+}
+
+ORDER_QUESTIONS = [
+    "What is the status of order {order_id}?",
+    "Where is my order #{order_id}?",
+    "Has order {order_id} shipped yet?",
+]
+INVENTORY_QUESTIONS = [
+    "How many {product} are left in stock?",
+    "Is the {product} available?",
+    "Do you have {product} in stock?",
+]
+TOP_QUESTIONS = [
+    "What are the top 5 most sold products?",
+    "Which products are the most popular?",
+    "Show me the top 10 best sellers",
+]
+HELP_QUESTIONS = ["What can you do?", "Help", "What are your capabilities?"]
+GENERAL_QUESTIONS = [
+    "Hi there, I have a question about returns",
+    "Thanks, that's all for now",
+    "Can you tell me more about that?",
+]
+
+# Used when the database has no dataset loaded
+FALLBACK_ORDER_IDS = [1, 2, 3, 4, 5]
+FALLBACK_PRODUCTS = ["Classic T-Shirt", "Denim Jacket", "Wool Socks"]
+
+def sample_dataset(size: int) -> Dict[str, List]:
+    """Random order ids and product names from the loaded dataset"""
+    db = SessionLocal()
+    try:
+        order_ids = list(db.execute(select(Order.order_id).limit(size * 20)).scalars())
+        products = list(db.execute(
+            select(Product.name).where(Product.name.isnot(None)).distinct().limit(size * 20)
+        ).scalars())
+    except Exception as e:
+        logger.warning(f"Could not sample the dataset ({e})")
+        order_ids, products = [], []
+    finally:
+        db.close()
+
+    if not order_ids or not products:
+        logger.warning("No dataset loaded; using placeholder order ids and products")
+    return {
+        "order_ids": random.sample(order_ids, min(size, len(order_ids))) or FALLBACK_ORDER_IDS,
+        "products": random.sample(products, min(size, len(products))) or FALLBACK_PRODUCTS,
+    }
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: Dict[str, str] = {}
+
+    def ok(self, endpoint: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+
+    def error(self, endpoint: str, detail: str):
+        self.errors[endpoint] += 1
+        self.error_samples.setdefault(endpoint, detail)
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[endpoint])
+            count = len(values) + self.errors[endpoint]
+            report[endpoint] = {
+                "requests": count,
+                "errors": self.errors[endpoint],
+                "rps": round(count / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(values) * 1000 / len(values), 1) if values else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+            }
+        return report
+
+class VirtualUser:
+    """One customer: a stable email and a conversation that rolls over every few turns"""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, dataset: Dict[str, List],
+                 recorder: Recorder, turns_per_conversation: int):
+        self.email = f"loadtest-{index}@example.com"
+        self.client = client
+        self.dataset = dataset
+        self.recorder = recorder
+        self.turns_per_conversation = turns_per_conversation
+        self.conversation_id: Optional[str] = None
+        self.turns = 0
+
+    def _question(self, scenario: str) -> str:
+        order_id = random.choice(self.dataset["order_ids"])
+        product = random.choice(self.dataset["products"])
+        if scenario == "order_status":
+            return random.choice(ORDER_QUESTIONS).format(order_id=order_id)
+        if scenario == "inventory":
+            return random.choice(INVENTORY_QUESTIONS).format(product=product)
+        if scenario == "top_products":
+            return random.choice(TOP_QUESTIONS)
+        if scenario == "help":
+            return random.choice(HELP_QUESTIONS)
+        if scenario == "multi_intent":
+            return f"Status of order {order_id}, and how many {product} are in stock?"
+        return random.choice(GENERAL_QUESTIONS)
+
+    def _chat_body(self, message: str) -> Dict[str, Any]:
+        if self.turns >= self.turns_per_conversation:
+            self.conversation_id, self.turns = None, 0
+        self.turns += 1
+        return {"message": message, "user_email": self.email, "conversation_id": self.conversation_id}
+
+    async def run(self, scenario: str):
+        if scenario == "stream":
+            await self._stream(self._question(random.choice(["order_status", "inventory", "top_products"])))
+        elif scenario == "list_conversations":
+            await self._get("GET /api/conversations/{user_email}", f"/api/conversations/{self.email}")
+        elif scenario == "message_page":
+            if self.conversation_id is None:
+                return await self.run("order_status")
+            await self._get(
+                "GET /api/conversations/{id}/messages",
+                f"/api/conversations/{self.conversation_id}/messages", params={"limit": 20}
+            )
+        else:
+            await self._chat(scenario, self._question(scenario))
+
+    async def _get(self, endpoint: str, path: str, params: Optional[Dict[str, Any]] = None):
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(path, params=params)
+        except httpx.HTTPError as e:
+            return self.recorder.error(endpoint, repr(e))
+        if response.status_code != 200:
+            return self.recorder.error(endpoint, f"{response.status_code} {response.text[:200]}")
+        self.recorder.ok(endpoint, time.perf_counter() - started)
+
+    async def _chat(self, scenario: str, message: str):
+        endpoint = f"POST /api/chat [{scenario}]"
+        started = time.perf_counter()
+        try:
+            response = await self.client.post("/api/chat", json=self._chat_body(message))
+        except httpx.HTTPError as e:
+            return self.recorder.error(endpoint, repr(e))
+        if response.status_code != 200:
+            return self.recorder.error(endpoint, f"{response.status_code} {response.text[:200]}")
+        self.recorder.ok(endpoint, time.perf_counter() - started)
+        self.conversation_id = response.json()["conversation_id"]
+
+    async def _stream(self, message: str):
+        endpoint = "POST /api/chat/stream"
+        started = time.perf_counter()
+        first_token = None
+        event = None
+        try:
+            async with self.client.stream("POST", "/api/chat/stream", json=self._chat_body(message)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    return self.recorder.error(endpoint, f"{response.status_code} {response.text[:200]}")
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif not line.startswith("data: "):
+                        continue
+                    elif event == "data":
+                        self.conversation_id = json.loads(line[len("data: "):])["conversation_id"]
+                    elif event == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+        except httpx.HTTPError as e:
+            return self.recorder.error(endpoint, repr(e))
+        self.recorder.ok(endpoint, time.perf_counter() - started)
+        if first_token is not None:
+            self.recorder.ok(f"{endpoint} (first token)", first_token)
+
+async def run_load(base_url: str, concurrency: int, duration: float, total_requests: Optional[int],
+                   dataset: Dict[str, List], turns_per_conversation: int, timeout: float) -> Dict[str, Any]:
+    recorder = Recorder()
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+    issued = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int):
+            nonlocal issued
+            user = VirtualUser(index, client, dataset, recorder, turns_per_conversation)
+            while time.perf_counter() < deadline:
+                if total_requests is not None:
+                    if issued >= total_requests:
+                        return
+                    issued += 1
+                await user.run(random.choices(scenarios, weights)[0])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stats = None
+        try:
+            stats = (await client.get("/api/stats")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    endpoints = recorder.report(elapsed)
+    all_requests = sum(row["requests"] for name, row in endpoints.items() if not name.endswith("(first token)"))
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "concurrency": concurrency,
+        "total_requests": all_requests,
+        "total_rps": round(all_requests / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+        "error_samples": recorder.error_samples,
+        "server_stats": stats,
+    }
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{result['total_requests']} requests in {result['elapsed_seconds']}s "
+          f"({result['total_rps']} req/s) with {result['concurrency']} virtual users\n")
+    header = f"{'endpoint':<48}{'reqs':>7}{'errs':>6}{'req/s':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in result["endpoints"].items():
+        print(f"{endpoint:<48}{row['requests']:>7}{row['errors']:>6}{row['rps']:>8}{row['mean_ms']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+    print("(latencies in ms)")
+    for endpoint, sample in result["error_samples"].items():
+        print(f"first error for {endpoint}: {sample}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay realistic chat traffic and report latency per endpoint")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Backend to load")
+    parser.add_argument("--concurrency", type=int, default=10, help="Virtual users sending requests back to back")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests (still bounded by --duration)")
+    parser.add_argument("--turns-per-conversation", type=int, default=5, help="Chat turns before a user starts a new conversation")
+    parser.add_argument("--sample-size", type=int, default=500, help="Order ids and product names sampled from the dataset")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible traffic mix")
+    parser.add_argument("--json", help="Also write the report (and the server's /api/stats) to this file")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    dataset = sample_dataset(args.sample_size)
+    logger.info(f"Sampled {len(dataset['order_ids'])} order ids and {len(dataset['products'])} products")
+
+    result = asyncio.run(run_load(
+        args.base_url, args.concurrency, args.duration, args.requests,
+        dataset, args.turns_per_conversation, args.timeout
+    ))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+        logger.info(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
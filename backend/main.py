@@ -1,17 +1,31 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
+import asyncio
+import json
 from datetime import datetime
 import logging
+import time
+import anyio
 
 # Import our services and models
-from database import get_db, create_tables
+from database import get_async_db, create_tables, SessionLocal, AsyncSessionLocal, pool_stats
 from models import Base
-from conversation_service import ConversationService
+from conversation_service import ConversationService, encode_cursor, decode_cursor
 from llm_service import LLMService
+from product_search import product_index
+from response_cache import response_cache
+from semantic_cache import semantic_cache
+from data_cache import data_cache
+from history_cache import history_cache
+from write_behind import write_queue
+from llm_gateway import llm_gateway
+from metrics import StageTimings, cache_label, http_request_seconds, render as render_metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +54,28 @@ class ChatResponse(BaseModel):
     data: Optional[Dict[str, Any]] = None
     metadata: Optional[Dict[str, Any]] = None
 
+class BatchChatRequest(BaseModel):
+    messages: List[ChatMessage]
+    # Store each turn in its conversation (a new one when none is given)
+    persist: bool = True
+    # Return results as NDJSON lines in completion order instead of one list
+    stream: bool = False
+    # Max LLM calls in flight; capped at CHAT_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
+
+class BatchChatResult(BaseModel):
+    index: int
+    response: Optional[str] = None
+    conversation_id: Optional[str] = None
+    intent: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    # Set instead of an answer when the message could not be processed
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+
 class ConversationResponse(BaseModel):
     conversation_id: str
     title: str
@@ -48,6 +84,7 @@ class ConversationResponse(BaseModel):
     total_messages: int
     user_messages: int
     ai_messages: int
+    last_message_at: Optional[str] = None
     is_active: bool
 
 class MessageResponse(BaseModel):
@@ -57,9 +94,38 @@ class MessageResponse(BaseModel):
     created_at: str
     metadata: Optional[Dict[str, Any]] = None
 
+class MessagePage(BaseModel):
+    messages: List[MessageResponse]
+    has_more: bool
+    older_cursor: Optional[str] = None
+    newer_cursor: Optional[str] = None
+
 # Initialize LLM service
 llm_service = LLMService()
 
+# Batch chat: LLM calls in flight per batch, and messages accepted per request
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+CHAT_BATCH_MAX_MESSAGES = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", "500"))
+
+# Add per-stage timings (ms) to the metadata returned by /api/chat
+CHAT_RESPONSE_TIMINGS = os.getenv("CHAT_RESPONSE_TIMINGS", "false").lower() == "true"
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Latency of every request, labelled by its route template (bounded label values)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and create tables"""
@@ -68,6 +134,20 @@ async def startup_event():
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
+    
+    # Build the in-memory product search index from the catalog
+    db = SessionLocal()
+    try:
+        product_index.refresh(db)
+    except Exception as e:
+        logger.error(f"Error building product index: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write chat turns still waiting in the group-commit queue"""
+    await write_queue.stop()
 
 @app.get("/")
 async def root():
@@ -86,78 +166,420 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+async def _polish_message(message_id: str, user_message: str, intent: str, data: Dict[str, Any],
+                          conversation_history: List[Dict], summary: Optional[str] = None) -> Optional[str]:
+    """Store the LLM-polished version of a template answer in its message metadata"""
+    polished = await llm_service.polish_response(user_message, intent, data, conversation_history, summary)
+    try:
+        async with AsyncSessionLocal() as db:
+            await ConversationService(db).update_message_metadata(message_id, {
+                "polish_pending": False,
+                "polished_response": polished
+            })
+    except Exception as e:
+        logger.error(f"Error storing polished response for message {message_id}: {e}")
+    return polished
+
+# Conversations whose summary is being updated by this process
+_summarizing = set()
+
+async def _update_summary(conversation_id: str):
+    """Fold messages that have left the recent-history window into the conversation's summary.
+    
+    Waits until a full window's worth of messages has left it, so each
+    summary call folds in ``history_cache.max_messages`` messages instead of
+    the two that leave the window on every turn.
+    """
+    if conversation_id in _summarizing:
+        return
+    _summarizing.add(conversation_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            conversation_service = ConversationService(db)
+            conversation, messages = await conversation_service.get_messages_to_summarize(
+                conversation_id, keep_recent=history_cache.max_messages,
+                min_messages=history_cache.max_messages
+            )
+            if messages:
+                summarized = conversation.summary_message_count or 0
+                summary = await llm_service.summarize_conversation(conversation.summary, messages)
+                await conversation_service.save_summary(conversation_id, summary, summarized, len(messages))
+                logger.info(f"Summarized {len(messages)} more messages of conversation {conversation_id}")
+    except Exception as e:
+        logger.error(f"Error updating summary for conversation {conversation_id}: {e}")
+    finally:
+        _summarizing.discard(conversation_id)
+
+def _needs_summary(conversation_history: List[Dict]) -> bool:
+    """Whether older messages may have left the recent-history window"""
+    return len(conversation_history) >= history_cache.max_messages
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(
     chat_message: ChatMessage,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Main chat endpoint with database persistence and LLM integration"""
+    """Main chat endpoint with database persistence and LLM integration.
+    
+    The turn's writes (new user or conversation, both messages and the
+    conversation counters) are committed together once the answer is ready.
+    Intents using the ``template-then-llm`` policy are answered from their
+    template; the LLM-polished answer is stored afterwards under
+    ``polished_response`` in the message metadata.
+    """
+    timings = StageTimings()
     try:
-        # Initialize services
-        conversation_service = ConversationService(db)
+        # Initialize services; the turn is written as one unit of work
+        conversation_service = ConversationService(db, autocommit=False)
         
-        # Get or create user
-        user = conversation_service.create_user(
-            email=chat_message.user_email,
-            first_name="Anonymous",
-            last_name="User"
-        )
-        
-        # Get or create conversation
-        conversation = conversation_service.get_or_create_conversation(
-            user_id=user.id,
-            conversation_id=chat_message.conversation_id
-        )
-        
-        # Add user message to conversation
-        user_message = conversation_service.add_message(
-            conversation_id=conversation.id,
-            content=chat_message.message,
-            is_user_message=True
-        )
+        with timings.stage("user"):
+            # Get or create user
+            user = await conversation_service.create_user(
+                email=chat_message.user_email,
+                first_name="Anonymous",
+                last_name="User"
+            )
+            
+            # Get or create conversation
+            conversation = await conversation_service.get_or_create_conversation(
+                user_id=user.id,
+                conversation_id=chat_message.conversation_id
+            )
         
-        # Get conversation history for context
-        conversation_history = conversation_service.get_conversation_history(
-            conversation_id=conversation.id,
-            limit=10
-        )
+        # Get conversation history for context (the current message is part of the prompt)
+        with timings.stage("history"):
+            conversation_history = await conversation_service.get_conversation_history(
+                conversation_id=conversation.id,
+                limit=history_cache.max_messages
+            )
         
         # Generate AI response using LLM
-        llm_response = llm_service.generate_response(
+        llm_response = await llm_service.generate_response(
             user_message=chat_message.message,
             conversation_history=conversation_history,
-            db=db
+            db=db,
+            summary=conversation.summary,
+            timings=timings
         )
         
-        # Add AI response to conversation
-        ai_message = conversation_service.add_message(
-            conversation_id=conversation.id,
-            content=llm_response["response"],
-            is_user_message=False,
-            message_metadata=llm_response.get("metadata", {})
-        )
+        # Add both messages to the conversation and write the turn
+        with timings.stage("persist"):
+            await conversation_service.add_message(
+                conversation_id=conversation.id,
+                content=chat_message.message,
+                is_user_message=True
+            )
+            ai_message = await conversation_service.add_message(
+                conversation_id=conversation.id,
+                content=llm_response["response"],
+                is_user_message=False,
+                message_metadata=llm_response.get("metadata", {})
+            )
+            await conversation_service.commit()
+        
+        metadata = llm_response.get("metadata") or {}
+        timings.observe(llm_response["intent"], cache_label(metadata))
+        if CHAT_RESPONSE_TIMINGS:
+            # Returned only; the stored message metadata stays as it was
+            metadata = {**metadata, "timings": timings.as_metadata()}
+        
+        if llm_response["metadata"].get("polish_pending"):
+            background_tasks.add_task(
+                _polish_message, ai_message.id, chat_message.message,
+                llm_response["intent"], llm_response["data"], conversation_history, conversation.summary
+            )
+        if _needs_summary(conversation_history):
+            background_tasks.add_task(_update_summary, conversation.id)
         
         return ChatResponse(
             response=llm_response["response"],
             conversation_id=conversation.id,
             data=llm_response.get("data"),
-            metadata=llm_response.get("metadata")
+            metadata=metadata
         )
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, payload: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(
+    chat_message: ChatMessage,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Chat endpoint that streams the answer as Server-Sent Events.
+    
+    Events: ``data`` (conversation id, intent and structured data, sent before
+    the LLM call), ``token`` (response chunks as Groq produces them) and
+    ``done`` (the persisted message id and metadata). The AI message is saved
+    once the stream completes or the client disconnects. For intents using the
+    ``template-then-llm`` policy a final ``polished`` event carries the
+    LLM-worded answer.
+    """
+    try:
+        # The user, conversation and user message are written in one commit
+        conversation_service = ConversationService(db, autocommit=False)
+        user = await conversation_service.create_user(
+            email=chat_message.user_email,
+            first_name="Anonymous",
+            last_name="User"
+        )
+        conversation = await conversation_service.get_or_create_conversation(
+            user_id=user.id,
+            conversation_id=chat_message.conversation_id
+        )
+        conversation_history = await conversation_service.get_conversation_history(
+            conversation_id=conversation.id,
+            limit=history_cache.max_messages
+        )
+        await conversation_service.add_message(
+            conversation_id=conversation.id,
+            content=chat_message.message,
+            is_user_message=True
+        )
+        await conversation_service.commit()
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    conversation_id = conversation.id
+    summary = conversation.summary
+    
+    async def event_stream():
+        started = time.perf_counter()
+        parts = []
+        # Filled in as the stream goes, so a disconnected stream still records what was known
+        metadata = {"model": llm_service.model, "streamed": True}
+        completed = False
+        intent, data = None, {}
+        # The request-scoped session may be closed once the response starts, so
+        # the stream uses its own session for lookups and persistence
+        async with AsyncSessionLocal() as stream_db:
+            try:
+                async for event in llm_service.stream_response(chat_message.message, conversation_history, stream_db, summary):
+                    if event["event"] == "data":
+                        intent, data = event["intent"], event["data"]
+                        metadata["intent"] = intent
+                        yield _sse("data", {
+                            "conversation_id": conversation_id,
+                            "intent": event["intent"],
+                            "data": event["data"]
+                        })
+                    elif event["event"] == "token":
+                        if not parts:
+                            metadata["time_to_first_token_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        parts.append(event["content"])
+                        yield _sse("token", {"content": event["content"]})
+                        if await request.is_disconnected():
+                            break
+                    elif event["event"] == "done":
+                        metadata = {**event["metadata"], "intent": intent}
+                        completed = True
+            finally:
+                if not completed:
+                    metadata["client_disconnected"] = True
+                content = "".join(parts).strip()
+                ai_message = None
+                if content:
+                    # Persist even if the client went away mid-stream
+                    with anyio.CancelScope(shield=True):
+                        ai_message = await ConversationService(stream_db).add_message(
+                            conversation_id=conversation_id,
+                            content=content,
+                            is_user_message=False,
+                            message_metadata=metadata
+                        )
+        if completed:
+            yield _sse("done", {
+                "conversation_id": conversation_id,
+                "message_id": ai_message.id if ai_message else None,
+                "metadata": metadata
+            })
+            if ai_message and metadata.get("polish_pending"):
+                polished = await _polish_message(
+                    ai_message.id, chat_message.message, intent, data, conversation_history, summary
+                )
+                yield _sse("polished", {"message_id": ai_message.id, "response": polished})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_update_summary, conversation_id) if _needs_summary(conversation_history) else None
+    )
+
+async def _prepare_batch(conversation_service: ConversationService, batch: BatchChatRequest) -> List[Dict[str, Any]]:
+    """One turn per message: its conversation, history and summary (staged, not committed).
+    
+    A message naming another user's conversation gets an ``error`` instead
+    and is neither answered nor stored.
+    """
+    users: Dict[str, Any] = {}
+    # (user id, requested conversation id) -> conversation
+    conversations: Dict[tuple, Any] = {}
+    histories: Dict[str, List[Dict]] = {}
+    turns = []
+    for item in batch.messages:
+        turn = {"message": item.message, "conversation_id": None, "history": [], "summary": None}
+        if batch.persist:
+            user = users.get(item.user_email)
+            if user is None:
+                user = users[item.user_email] = await conversation_service.create_user(
+                    email=item.user_email, first_name="Anonymous", last_name="User"
+                )
+            # A user's messages naming the same conversation share it, even if it had to be created
+            key = (user.id, item.conversation_id)
+            conversation = conversations.get(key) if item.conversation_id else None
+            if conversation is None:
+                existing = await conversation_service.get_conversation(item.conversation_id) \
+                    if item.conversation_id else None
+                if existing is not None and existing.user_id != user.id:
+                    turn["error"] = f"Conversation {item.conversation_id} does not belong to {item.user_email}"
+                    turns.append(turn)
+                    continue
+                conversation = existing or await conversation_service.create_conversation(user.id)
+                if item.conversation_id:
+                    conversations[key] = conversation
+            if conversation.id not in histories:
+                histories[conversation.id] = await conversation_service.get_conversation_history(
+                    conversation_id=conversation.id, limit=history_cache.max_messages
+                )
+            turn.update(conversation_id=conversation.id, history=histories[conversation.id],
+                        summary=conversation.summary)
+        turns.append(turn)
+    return turns
+
+async def _persist_batch(conversation_service: ConversationService, turns: List[Dict[str, Any]],
+                         results: Dict[int, Dict[str, Any]], background_tasks: BackgroundTasks):
+    """Store the answered turns in input order with one commit, then queue polish and summary jobs"""
+    for index, turn in enumerate(turns):
+        result = results.get(index)
+        if result is None or turn["conversation_id"] is None:
+            continue
+        await conversation_service.add_message(
+            conversation_id=turn["conversation_id"], content=turn["message"], is_user_message=True
+        )
+        ai_message = await conversation_service.add_message(
+            conversation_id=turn["conversation_id"], content=result["response"],
+            is_user_message=False, message_metadata=result["metadata"]
+        )
+        if result["metadata"].get("polish_pending"):
+            background_tasks.add_task(
+                _polish_message, ai_message.id, turn["message"], result["intent"], result["data"],
+                turn["history"], turn["summary"]
+            )
+    await conversation_service.commit()
+    histories = {turn["conversation_id"]: turn["history"] for turn in turns if turn["conversation_id"]}
+    for conversation_id, history in histories.items():
+        if _needs_summary(history):
+            background_tasks.add_task(_update_summary, conversation_id)
+
+async def _answer_batch(turns: List[Dict[str, Any]], db: AsyncSession,
+                        concurrency: int) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """``generate_batch`` over the turns without an ``error``, yielding their batch indexes"""
+    answerable = [index for index, turn in enumerate(turns) if "error" not in turn]
+    async for position, result in llm_service.generate_batch([turns[index] for index in answerable], db, concurrency):
+        yield answerable[position], result
+
+def _batch_error(index: int, turn: Dict[str, Any]) -> Dict[str, Any]:
+    return {"index": index, "error": turn["error"]}
+
+def _batch_result(index: int, turn: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    if turn["conversation_id"] is None:
+        # Nothing is stored, so there is no message to polish later
+        result["metadata"].pop("polish_pending", None)
+    return {
+        "index": index,
+        "response": result["response"],
+        "conversation_id": turn["conversation_id"],
+        "intent": result["intent"],
+        "data": result["data"],
+        "metadata": result["metadata"],
+    }
+
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(
+    batch: BatchChatRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Answer many messages in one request.
+    
+    Routing and data lookups run for the whole batch at once (one query for
+    all order ids), then LLM calls fan out with at most ``concurrency`` in
+    flight. Messages are answered independently: messages for the same
+    conversation all see its history as it was before the batch. Results come
+    back in input order, or with ``stream`` as NDJSON lines (each with its
+    ``index``) as they finish. With ``persist`` every turn is stored like a
+    ``/api/chat`` turn once all of them are answered.
+    """
+    if len(batch.messages) > CHAT_BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"At most {CHAT_BATCH_MAX_MESSAGES} messages per batch")
+    concurrency = min(batch.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY)
+    
+    try:
+        conversation_service = ConversationService(db, autocommit=False)
+        turns = await _prepare_batch(conversation_service, batch)
+        if batch.persist:
+            # New users and conversations; the messages follow once answered
+            await conversation_service.commit()
+    except Exception as e:
+        logger.error(f"Error in chat batch endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not batch.stream:
+        try:
+            results = {}
+            async for index, result in _answer_batch(turns, db, concurrency):
+                results[index] = result
+            if batch.persist:
+                await _persist_batch(conversation_service, turns, results, background_tasks)
+            return BatchChatResponse(results=[
+                _batch_result(index, turn, results[index]) if "error" not in turn else _batch_error(index, turn)
+                for index, turn in enumerate(turns)
+            ])
+        except Exception as e:
+            logger.error(f"Error in chat batch endpoint: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    async def result_stream():
+        results = {}
+        # The request-scoped session may be closed once the response starts
+        async with AsyncSessionLocal() as stream_db:
+            try:
+                for index, turn in enumerate(turns):
+                    if "error" in turn:
+                        yield json.dumps(_batch_error(index, turn)) + "\n"
+                async for index, result in _answer_batch(turns, stream_db, concurrency):
+                    results[index] = result
+                    yield json.dumps(_batch_result(index, turns[index], result), default=str) + "\n"
+            finally:
+                if batch.persist and results:
+                    # Store what was answered even if the client went away
+                    with anyio.CancelScope(shield=True):
+                        try:
+                            await _persist_batch(ConversationService(stream_db, autocommit=False), turns, results,
+                                                 background_tasks)
+                        except Exception as e:
+                            logger.error(f"Error storing chat batch: {e}")
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson", background=background_tasks)
+
 @app.get("/api/conversations/{user_email}", response_model=List[ConversationResponse])
 async def get_user_conversations(
     user_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all conversations for a user"""
     try:
         conversation_service = ConversationService(db)
-        user = conversation_service.create_user(email=user_email)
-        conversations = conversation_service.get_user_conversations(user.id)
+        conversations = await conversation_service.get_user_conversations_by_email(user_email)
         
         return [
             ConversationResponse(
@@ -165,9 +587,10 @@ async def get_user_conversations(
                 title=conv.title,
                 created_at=conv.created_at.isoformat() if conv.created_at else "",
                 updated_at=conv.updated_at.isoformat() if conv.updated_at else "",
-                total_messages=len(conversation_service.get_conversation_messages(conv.id)),
-                user_messages=len([m for m in conversation_service.get_conversation_messages(conv.id) if m.is_user_message]),
-                ai_messages=len([m for m in conversation_service.get_conversation_messages(conv.id) if not m.is_user_message]),
+                total_messages=conv.total_messages,
+                user_messages=conv.user_messages,
+                ai_messages=conv.ai_messages,
+                last_message_at=conv.last_message_at.isoformat() if conv.last_message_at else None,
                 is_active=conv.is_active
             )
             for conv in conversations
@@ -176,26 +599,51 @@ async def get_user_conversations(
         logger.error(f"Error getting user conversations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
+@app.get("/api/conversations/{conversation_id}/messages", response_model=MessagePage)
 async def get_conversation_messages(
     conversation_id: str,
-    db: Session = Depends(get_db)
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get messages for a specific conversation"""
+    """Get one page of messages for a conversation, oldest first.
+    
+    Without a cursor the latest ``limit`` messages are returned. Pass
+    ``older_cursor`` as ``before`` to load the page before them, or
+    ``newer_cursor`` as ``after`` to load messages added since. ``has_more``
+    says whether another page exists in the direction being paged.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    for cursor in (before, after):
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         conversation_service = ConversationService(db)
-        messages = conversation_service.get_conversation_messages(conversation_id, limit=100)
+        messages, has_more = await conversation_service.get_messages_page(
+            conversation_id, limit=limit, before=before, after=after
+        )
         
-        return [
-            MessageResponse(
-                id=msg.id,
-                content=msg.content,
-                is_user_message=msg.is_user_message,
-                created_at=msg.created_at.isoformat() if msg.created_at else "",
-                metadata=msg.message_metadata
-            )
-            for msg in messages
-        ]
+        return MessagePage(
+            messages=[
+                MessageResponse(
+                    id=msg.id,
+                    content=msg.content,
+                    is_user_message=msg.is_user_message,
+                    created_at=msg.created_at.isoformat() if msg.created_at else "",
+                    metadata=msg.message_metadata
+                )
+                for msg in messages
+            ],
+            has_more=has_more,
+            older_cursor=encode_cursor(messages[0]) if messages else before,
+            newer_cursor=encode_cursor(messages[-1]) if messages else after
+        )
     except Exception as e:
         logger.error(f"Error getting conversation messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -204,12 +652,12 @@ async def get_conversation_messages(
 async def update_conversation_title(
     conversation_id: str,
     title: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update conversation title"""
     try:
         conversation_service = ConversationService(db)
-        success = conversation_service.update_conversation_title(conversation_id, title)
+        success = await conversation_service.update_conversation_title(conversation_id, title)
         
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -222,12 +670,12 @@ async def update_conversation_title(
 @app.delete("/api/conversations/{conversation_id}")
 async def deactivate_conversation(
     conversation_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Deactivate a conversation"""
     try:
         conversation_service = ConversationService(db)
-        success = conversation_service.deactivate_conversation(conversation_id)
+        success = await conversation_service.deactivate_conversation(conversation_id)
         
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -237,11 +685,40 @@ async def deactivate_conversation(
         logger.error(f"Error deactivating conversation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stats")
+async def get_stats():
+    """Cache and service statistics"""
+    return {
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "data_cache": data_cache.stats(),
+        "history_cache": history_cache.stats(),
+        "write_queue": write_queue.stats(),
+        "db_pool": pool_stats(),
+        "llm_gateway": llm_gateway.stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latency histograms, LLM token counts, pool, gateway and cache counters for Prometheus"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/api/admin/product-index/refresh")
+async def refresh_product_index():
+    """Rebuild the product search index after the catalog has been reloaded"""
+    try:
+        await asyncio.to_thread(product_index.reload)
+        return {"message": "Product index refreshed", "products": product_index.size}
+    except Exception as e:
+        logger.error(f"Error refreshing product index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Legacy endpoint for backward compatibility
 @app.post("/chat", response_model=ChatResponse)
-async def legacy_chat_endpoint(chat_message: ChatMessage, db: Session = Depends(get_db)):
+async def legacy_chat_endpoint(chat_message: ChatMessage, background_tasks: BackgroundTasks,
+                               db: AsyncSession = Depends(get_async_db)):
     """Legacy chat endpoint for backward compatibility"""
-    return await chat_endpoint(chat_message, db)
+    return await chat_endpoint(chat_message, background_tasks, db)
 
 if __name__ == "__main__":
     import uvicorn
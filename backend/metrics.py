@@ -0,0 +1,234 @@
+"""
+Prometheus metrics, served at ``/metrics`` in the text exposition format.
+
+- ``chat_stage_seconds{stage, intent, cache}``: time spent in each stage of
+  ``/api/chat`` (``user``, ``history``, ``route``, ``data``, ``generate``,
+  ``persist`` and ``total``). ``cache`` is ``hit`` when the answer came from
+  the response cache, ``miss`` when it went to the LLM and ``bypass`` for
+  template answers, which never consult it
+- ``http_request_seconds{method, route, status}``: every API request
+- ``llm_call_seconds{purpose}`` and ``llm_tokens_total{purpose, type}``:
+  Groq calls and the prompt/completion tokens they used
+- connection pools, the LLM gateway and the caches are read from their
+  ``stats()`` when scraped, so they cost nothing between scrapes
+
+Label values are kept to small fixed sets (intents, stage names, route
+templates) so the number of series stays bounded.
+"""
+
+import time
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from database import pool_stats
+from llm_gateway import llm_gateway
+from response_cache import response_cache
+from semantic_cache import semantic_cache
+from data_cache import data_cache
+from history_cache import history_cache
+
+# Seconds; covers cached answers (~1ms) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (labels, value) pairs of one metric
+Samples = List[Tuple[Dict[str, Any], float]]
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple((name, str(labels[name])) for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(dict(key))} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (not cumulative) + overflow, sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple((name, str(labels[name])) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._values.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+chat_stage_seconds = Histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat request", ("stage", "intent", "cache")
+)
+http_request_seconds = Histogram(
+    "http_request_seconds", "API request latency", ("method", "route", "status")
+)
+llm_call_seconds = Histogram(
+    "llm_call_seconds", "Duration of Groq calls, streams until their last token", ("purpose",)
+)
+llm_tokens_total = Counter(
+    "llm_tokens_total", "Tokens used by Groq calls", ("purpose", "type")
+)
+
+def record_llm_usage(purpose: str, usage: Any) -> None:
+    """Count the tokens of a Groq call from its ``usage`` block, if it sent one"""
+    if usage is None:
+        return
+    llm_tokens_total.inc(usage.prompt_tokens or 0, purpose=purpose, type="prompt")
+    llm_tokens_total.inc(usage.completion_tokens or 0, purpose=purpose, type="completion")
+
+def cache_label(metadata: Dict[str, Any]) -> str:
+    """``cache`` label of a chat answer, from its metadata"""
+    if metadata.get("cache_hit"):
+        return "hit"
+    return "bypass" if metadata.get("response_policy", "llm") != "llm" else "miss"
+
+class StageTimings:
+    """Stage durations of one chat request.
+
+    Stages are timed as the request runs and observed together at the end,
+    once the intent and cache outcome they are labelled with are known.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def observe(self, intent: str, cache: str) -> None:
+        for name, seconds in self.stages.items():
+            chat_stage_seconds.observe(seconds, stage=name, intent=intent, cache=cache)
+        chat_stage_seconds.observe(time.perf_counter() - self.started, stage="total", intent=intent, cache=cache)
+
+    def as_metadata(self) -> Dict[str, float]:
+        """Milliseconds per stage, for the ``timings`` block of a chat response"""
+        timings = {f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        timings["total_ms"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return timings
+
+def _render_samples(name: str, metric_type: str, documentation: str, samples: Samples) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return lines
+
+def _pool_metrics() -> List[str]:
+    pools = pool_stats()
+    return [
+        *_render_samples("db_pool_size", "gauge", "Connections the pool keeps open",
+                         [({"pool": name}, stats["size"]) for name, stats in pools.items()]),
+        *_render_samples("db_pool_connections", "gauge", "Pool connections by state", [
+            ({"pool": name, "state": state}, stats[state])
+            for name, stats in pools.items() for state in ("in_use", "idle", "overflow")
+        ]),
+        *_render_samples("db_pool_checkouts_total", "counter", "Connections checked out of the pool",
+                         [({"pool": name}, stats["checkouts"]) for name, stats in pools.items()]),
+        *_render_samples("db_pool_checkout_wait_seconds_total", "counter", "Time spent checking out connections",
+                         [({"pool": name}, stats["total_wait_ms"] / 1000) for name, stats in pools.items()]),
+        *_render_samples("db_pool_slow_checkouts_total", "counter", "Checkouts that had to wait for a connection",
+                         [({"pool": name}, stats["slow_checkouts"]) for name, stats in pools.items()]),
+        *_render_samples("db_pool_timeouts_total", "counter", "Checkouts that timed out",
+                         [({"pool": name}, stats["timeouts"]) for name, stats in pools.items()]),
+    ]
+
+def _gateway_metrics() -> List[str]:
+    stats = llm_gateway.stats()
+    return [
+        *_render_samples("llm_in_flight", "gauge", "Groq calls in flight", [({}, stats["in_flight"])]),
+        *_render_samples("llm_waiting", "gauge", "Calls waiting for an LLM slot", [({}, stats["waiting"])]),
+        *_render_samples("llm_breaker_open", "gauge", "1 while the LLM circuit breaker is open or half-open",
+                         [({}, int(stats["breaker_state"] != "closed"))]),
+        *_render_samples("llm_calls_total", "counter", "Groq calls by outcome", [
+            ({"outcome": "success"}, stats["successes"]),
+            ({"outcome": "error"}, stats["errors"]),
+        ]),
+        *_render_samples("llm_coalesced_total", "counter", "Callers that shared an identical call in flight",
+                         [({}, stats["coalesced"])]),
+        *_render_samples("llm_deadline_exceeded_total", "counter", "Callers answered from the template after their deadline",
+                         [({}, stats["deadline_exceeded"])]),
+        *_render_samples("llm_short_circuited_total", "counter", "Calls refused by the open circuit breaker",
+                         [({}, stats["short_circuited"])]),
+    ]
+
+def _cache_metrics() -> List[str]:
+    response, semantic, history = response_cache.stats(), semantic_cache.stats(), history_cache.stats()
+    hits = [
+        ({"cache": "response"}, response["hits"]),
+        ({"cache": "semantic"}, semantic["hits"]),
+        ({"cache": "history"}, history["hits"]),
+    ]
+    misses = [
+        ({"cache": "response"}, response["misses"]),
+        ({"cache": "semantic"}, semantic["lookups"] - semantic["hits"]),
+        ({"cache": "history"}, history["misses"]),
+    ]
+    for intent, counters in data_cache.stats()["intents"].items():
+        hits.append(({"cache": f"data_{intent}"}, counters["hits"]))
+        misses.append(({"cache": f"data_{intent}"}, counters["misses"]))
+    return [
+        *_render_samples("cache_hits_total", "counter", "Cache hits", hits),
+        *_render_samples("cache_misses_total", "counter", "Cache misses", misses),
+    ]
+
+# Read at scrape time
+COLLECTORS: List[Callable[[], List[str]]] = [_pool_metrics, _gateway_metrics, _cache_metrics]
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in (chat_stage_seconds, http_request_seconds, llm_call_seconds, llm_tokens_total):
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,43 @@
+"""Shared helpers for migrations that must be safe to run on a live database."""
+
+from alembic import op
+import sqlalchemy as sa
+
+def table_exists(table: str) -> bool:
+    """Whether ``table`` already exists (e.g. created by create_all)"""
+    if op.get_context().as_sql:
+        return False
+    return sa.inspect(op.get_bind()).has_table(table)
+
+def column_exists(table: str, column: str) -> bool:
+    if op.get_context().as_sql:
+        return False
+    return any(c["name"] == column for c in sa.inspect(op.get_bind()).get_columns(table))
+
+def index_exists(table: str, name: str) -> bool:
+    """Whether ``table`` already has an index called ``name`` (e.g. created by create_all)"""
+    if op.get_context().as_sql:
+        return False
+    return any(ix["name"] == name for ix in sa.inspect(op.get_bind()).get_indexes(table))
+
+def create_index_online(name: str, table: str, columns: list) -> None:
+    """Create an index without blocking writes.
+
+    On MySQL this is an in-place build with ``LOCK=NONE``, so reads and writes
+    continue while the index is built; other databases use a plain CREATE INDEX.
+    """
+    if index_exists(table, name):
+        return
+    if op.get_context().dialect.name == "mysql":
+        column_list = ", ".join(f"`{c}`" for c in columns)
+        op.execute(f"ALTER TABLE `{table}` ADD INDEX `{name}` ({column_list}), ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        op.create_index(name, table, columns)
+
+def drop_index_online(name: str, table: str) -> None:
+    if not index_exists(table, name):
+        return
+    if op.get_context().dialect.name == "mysql":
+        op.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`, ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        op.drop_index(name, table_name=table)
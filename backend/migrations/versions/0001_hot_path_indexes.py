@@ -0,0 +1,36 @@
+"""Add composite indexes for the hot query paths
+
+Revision ID: 0001_hot_path_indexes
+Revises:
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from migrations.helpers import create_index_online, drop_index_online
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_hot_path_indexes"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_messages_conversation_id_created_at", "messages", ["conversation_id", "created_at", "id"]),
+    ("ix_conversations_user_id_is_active_updated_at", "conversations", ["user_id", "is_active", "updated_at"]),
+    ("ix_inventory_items_product_id_sold_at", "inventory_items", ["product_id", "sold_at"]),
+    ("ix_inventory_items_product_name_sold_at", "inventory_items", ["product_name", "sold_at"]),
+    ("ix_order_items_product_id", "order_items", ["product_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        create_index_online(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        drop_index_online(name, table)
@@ -0,0 +1,37 @@
+"""Add the data_versions table used to invalidate API data caches after a load
+
+Revision ID: 0002_data_versions
+Revises: 0001_hot_path_indexes
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import table_exists
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_data_versions"
+down_revision: Union[str, Sequence[str], None] = "0001_hot_path_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if table_exists("data_versions"):
+        return
+    op.create_table(
+        "data_versions",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("version", sa.BigInteger, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if table_exists("data_versions"):
+        op.drop_table("data_versions")
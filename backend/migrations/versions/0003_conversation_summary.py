@@ -0,0 +1,36 @@
+"""Add the rolling summary columns to conversations
+
+Revision ID: 0003_conversation_summary
+Revises: 0002_data_versions
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import column_exists
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_conversation_summary"
+down_revision: Union[str, Sequence[str], None] = "0002_data_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable or defaulted trailing columns, which MySQL 8 adds in place (ALGORITHM=INSTANT)
+    if not column_exists("conversations", "summary"):
+        op.add_column("conversations", sa.Column("summary", sa.Text, nullable=True))
+    if not column_exists("conversations", "summary_message_count"):
+        op.add_column("conversations", sa.Column("summary_message_count", sa.Integer,
+                                                 nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in ("summary_message_count", "summary"):
+        if column_exists("conversations", column):
+            op.drop_column("conversations", column)
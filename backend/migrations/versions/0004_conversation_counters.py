@@ -0,0 +1,40 @@
+"""Add message counters to conversations
+
+Revision ID: 0004_conversation_counters
+Revises: 0003_conversation_summary
+Create Date: 2026-10-17
+
+Existing conversations start at zero; run ``python backfill_counters.py``
+once after upgrading to count their messages.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import column_exists
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_conversation_counters"
+down_revision: Union[str, Sequence[str], None] = "0003_conversation_summary"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ["total_messages", "user_messages", "ai_messages"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Defaulted or nullable trailing columns, which MySQL 8 adds in place (ALGORITHM=INSTANT)
+    for name in COUNTERS:
+        if not column_exists("conversations", name):
+            op.add_column("conversations", sa.Column(name, sa.Integer, nullable=False, server_default="0"))
+    if not column_exists("conversations", "last_message_at"):
+        op.add_column("conversations", sa.Column("last_message_at", sa.DateTime, nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in ["last_message_at"] + list(reversed(COUNTERS)):
+        if column_exists("conversations", name):
+            op.drop_column("conversations", name)
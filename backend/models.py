@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, Float, JSON, Index
 from sqlalchemy.dialects.mysql import JSON as MySQLJSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -38,10 +38,23 @@ class Conversation(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # Rolling summary of the oldest summary_message_count messages, kept out of the prompt verbatim
+    summary = Column(Text)
+    summary_message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Message counters, maintained by ConversationService.add_message
+    total_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    user_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    ai_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime)
     
     # Relationships
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", order_by="Message.created_at")
+    
+    __table_args__ = (
+        # Conversation list: WHERE user_id = ? AND is_active ORDER BY updated_at DESC
+        Index("ix_conversations_user_id_is_active_updated_at", "user_id", "is_active", "updated_at"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -55,6 +68,11 @@ class Message(Base):
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        # History for a chat turn: WHERE conversation_id = ? ORDER BY created_at, id
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at", "id"),
+    )
 
 # E-commerce data models
 class EcommerceUser(Base):
@@ -112,6 +130,13 @@ class InventoryItem(Base):
     product_department = Column(String(100))
     product_sku = Column(String(100))
     product_distribution_center_id = Column(Integer, ForeignKey("distribution_centers.id"))
+    
+    __table_args__ = (
+        # Covers availability counts per product: COUNT/SUM(sold_at IS NULL) grouped by product_id
+        Index("ix_inventory_items_product_id_sold_at", "product_id", "sold_at"),
+        # Lookups by product name with availability
+        Index("ix_inventory_items_product_name_sold_at", "product_name", "sold_at"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
@@ -138,4 +163,46 @@ class OrderItem(Base):
     created_at = Column(DateTime)
     shipped_at = Column(DateTime)
     delivered_at = Column(DateTime)
-    returned_at = Column(DateTime) 
\ No newline at end of file
+    returned_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Order items of a product (sales rollup refreshes, per-product order lookups)
+        Index("ix_order_items_product_id", "product_id"),
+    )
+
+# Data loading bookkeeping
+class LoadCheckpoint(Base):
+    __tablename__ = "load_checkpoints"
+    
+    table_name = Column(String(100), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    byte_offset = Column(BigInteger, nullable=False)
+    byte_length = Column(BigInteger, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    last_id = Column(BigInteger)
+    content_hash = Column(String(64), nullable=False)  # sha256 of the chunk's raw CSV bytes
+    loaded_at = Column(DateTime, server_default=func.now())
+
+# Sales per product, rebuilt from order_items by sales_rollup.refresh_sales_rollup
+class ProductSalesRollup(Base):
+    __tablename__ = "product_sales_rollup"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    product_name = Column(String(255))
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    returned_units = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_product_sales_rollup_units_sold", "units_sold"),
+    )
+
+# Dataset version stamp, bumped by load_data.py whenever it writes; the API
+# drops its data caches when it sees the version change
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
@@ -0,0 +1,202 @@
+"""
+In-memory product resolver for chat messages.
+
+Built once from the ``products`` table (name, brand, category, department), it
+maps free-form chat text such as "how many levis jeans are left in stock?" to
+candidate product ids without touching the database:
+
+- chat phrasing ("how many", "in stock", ...) is stripped with a stop-word list
+- remaining tokens are looked up in an inverted index and ranked with BM25,
+  weighting name matches above brand/category/department matches
+- tokens missing from the vocabulary are corrected through a character
+  trigram index, so small typos ("jeens", "sweter") still resolve
+
+Call ``refresh`` (or ``reload`` from a worker thread) after the catalog is
+reloaded.
+"""
+
+import math
+import re
+import threading
+import logging
+from collections import defaultdict, Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Product
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Chat phrasing that never identifies a product
+STOP_WORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "at", "available", "availability",
+    "be", "can", "check", "could", "do", "does", "for", "from", "get", "give", "have", "how",
+    "i", "in", "inventory", "is", "it", "items", "left", "level", "levels", "many", "me", "much",
+    "my", "of", "on", "or", "please", "quantity", "remaining", "show", "some", "status", "still",
+    "stock", "stocked", "tell", "the", "there", "to", "units", "we", "what", "whats", "which",
+    "with", "you", "your",
+}
+
+# Relative weight of each catalog field in a product's indexed document
+FIELD_WEIGHTS = {"name": 3, "brand": 2, "category": 1, "department": 1}
+
+# Minimum trigram Jaccard similarity for a typo correction
+MIN_TYPO_SIMILARITY = 0.3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; apostrophes are dropped so "levi's" -> "levis" """
+    return TOKEN_RE.findall((text or "").lower().replace("'", ""))
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._names: Dict[int, str] = {}
+        self._trigram_index: Dict[str, Set[str]] = {}
+        self._avg_length = 0.0
+        self.size = 0
+
+    def build(self, products) -> None:
+        """Build the index from rows with id, name, brand, category and department"""
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        doc_lengths: Dict[int, int] = {}
+        names: Dict[int, str] = {}
+
+        for product in products:
+            term_counts: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(getattr(product, field, None)):
+                    term_counts[token] += weight
+            for token, count in term_counts.items():
+                postings[token][product.id] = count
+            doc_lengths[product.id] = sum(term_counts.values())
+            names[product.id] = product.name
+
+        trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        for token in postings:
+            for gram in trigrams(token):
+                trigram_index[gram].add(token)
+
+        # Swap everything in at once so concurrent searches see a consistent index
+        with self._lock:
+            self._postings = dict(postings)
+            self._doc_lengths = doc_lengths
+            self._names = names
+            self._trigram_index = dict(trigram_index)
+            self._avg_length = sum(doc_lengths.values()) / len(doc_lengths) if doc_lengths else 0.0
+            self.size = len(doc_lengths)
+        logger.info(f"Product index built: {self.size} products, {len(postings)} terms")
+
+    def refresh(self, db: Session) -> None:
+        """(Re)build the index from the products table"""
+        products = db.query(
+            Product.id, Product.name, Product.brand, Product.category, Product.department
+        ).all()
+        self.build(products)
+
+    def reload(self) -> None:
+        """``refresh`` on a session of its own, so it can run in a worker thread.
+
+        Searches keep using the current index until the new one is swapped in.
+        """
+        with SessionLocal() as db:
+            self.refresh(db)
+
+    def _correct(self, token: str, trigram_index) -> Optional[str]:
+        """Closest vocabulary term by trigram Jaccard similarity, if close enough.
+
+        Candidates must share the first letter and be of similar length, which
+        keeps ordinary chat words from being "corrected" into product terms.
+        """
+        if len(token) < 3:
+            return None
+        grams = trigrams(token)
+        overlap: Counter = Counter()
+        for gram in grams:
+            for candidate in trigram_index.get(gram, ()):
+                overlap[candidate] += 1
+        best, best_score = None, 0.0
+        for candidate, shared in overlap.items():
+            if candidate[0] != token[0] or abs(len(candidate) - len(token)) > 2:
+                continue
+            score = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best if best_score >= MIN_TYPO_SIMILARITY else None
+
+    def query_terms(self, message: str) -> List[str]:
+        """Tokens of ``message`` that can identify a product, typo-corrected"""
+        with self._lock:
+            postings, trigram_index = self._postings, self._trigram_index
+        terms = []
+        for token in tokenize(message):
+            if token in STOP_WORDS or token.isdigit():
+                continue
+            if token not in postings:
+                # Naive plural handling before falling back to fuzzy matching
+                if token.endswith("s") and token[:-1] in postings:
+                    token = token[:-1]
+                elif token + "s" in postings:
+                    token = token + "s"
+                else:
+                    token = self._correct(token, trigram_index)
+            if token and token not in terms:
+                terms.append(token)
+        return terms
+
+    def search(self, message: str, limit: Optional[int] = 50) -> List[Tuple[int, float]]:
+        """Rank products for ``message``; returns ``(product_id, score)`` pairs, best first.
+
+        Only products matching every recognised query term are returned when
+        any exist, falling back to products matching some of them.
+        """
+        return self._rank(self.query_terms(message), limit)
+
+    def _rank(self, terms: List[str], limit: Optional[int]) -> List[Tuple[int, float]]:
+        with self._lock:
+            postings, doc_lengths = self._postings, self._doc_lengths
+            avg_length, size = self._avg_length, self.size
+        if not terms or not size:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for term in terms:
+            docs = postings.get(term, {})
+            idf = math.log(1 + (size - len(docs) + 0.5) / (len(docs) + 0.5))
+            for product_id, tf in docs.items():
+                norm = tf + K1 * (1 - B + B * doc_lengths[product_id] / avg_length)
+                scores[product_id] += idf * tf * (K1 + 1) / norm
+                matched[product_id] += 1
+
+        best_coverage = max(matched.values())
+        ranked = sorted(
+            (pid for pid in scores if matched[pid] == best_coverage),
+            key=lambda pid: scores[pid], reverse=True
+        )
+        return [(pid, scores[pid]) for pid in ranked[:limit]]
+
+    def resolve(self, message: str, limit: Optional[int] = 50) -> Dict[str, object]:
+        """Candidate product ids for ``message`` with the terms that matched"""
+        terms = self.query_terms(message)
+        results = self._rank(terms, limit)
+        return {
+            "product_ids": [pid for pid, _ in results],
+            "terms": terms,
+            "top_match": self._names.get(results[0][0]) if results else None
+        }
+
+product_index = ProductIndex()
@@ -0,0 +1,140 @@
+"""
+LRU + TTL cache for LLM responses.
+
+A cached answer is keyed on the model, the intent, a fingerprint of the data
+payload the answer was generated from and a normalized form of the user's
+message. When the underlying data changes the fingerprint changes, so stale
+answers are never served; the superseded entry is dropped as soon as the new
+answer is stored.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Intents whose answers depend only on the question and the data payload.
+# "general" answers depend on the conversation, so they are never cached.
+DEFAULT_TTLS = {
+    "order_status": 60,
+    "inventory": 120,
+    "top_products": 600,
+    "help": 3600,
+}
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_message(message: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a message"""
+    message = _PUNCTUATION_RE.sub(" ", (message or "").lower())
+    return _WHITESPACE_RE.sub(" ", message).strip()
+
+def data_fingerprint(data: Any) -> str:
+    """Stable hash of a data payload"""
+    encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, ttls: Optional[Dict[str, float]] = None, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # (model, intent, normalized message) -> key of the latest entry for that question
+        self._latest: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, intent: str, data: Any, message: str, model: str) -> Optional[str]:
+        """Cache key for a turn, or None when answers for this intent are not cacheable"""
+        if not self.enabled or intent not in self.ttls:
+            return None
+        raw = "|".join([model, intent, data_fingerprint(data), normalize_message(message)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["expires_at"] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["response"]
+
+    def set(self, key: Optional[str], response: str, intent: str, message: str, model: str) -> None:
+        if key is None or not response:
+            return
+        question = (model, intent, normalize_message(message))
+        with self._lock:
+            # Same question answered from different data: the old answer is stale
+            previous = self._latest.get(question)
+            if previous is not None and previous != key and previous in self._entries:
+                self._remove(previous)
+                self.invalidations += 1
+            self._entries[key] = {
+                "response": response,
+                "question": question,
+                "expires_at": time.monotonic() + self.ttls[intent],
+            }
+            self._entries.move_to_end(key)
+            self._latest[question] = key
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if self._latest.get(entry["question"]) == key:
+            del self._latest[entry["question"]]
+
+    def clear(self) -> None:
+        """Drop every cached answer (e.g. after the dataset is reloaded)"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._latest.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+def ttls_from_env() -> Dict[str, float]:
+    """Per-intent TTLs, overridable with RESPONSE_CACHE_TTL_<INTENT> (seconds)"""
+    return {
+        intent: float(os.getenv(f"RESPONSE_CACHE_TTL_{intent.upper()}", ttl))
+        for intent, ttl in DEFAULT_TTLS.items()
+    }
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttls=ttls_from_env(),
+    enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+)
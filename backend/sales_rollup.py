@@ -0,0 +1,91 @@
+"""
+Maintenance of the ``product_sales_rollup`` table.
+
+The rollup holds units sold, revenue and returns per product, aggregated from
+``order_items`` joined to ``products``, so "top products" questions become an
+indexed read instead of a scan. It is rebuilt after a full load and refreshed
+for just the affected products as incremental loads touch ``order_items`` or
+``products``.
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+import pandas as pd
+from sqlalchemy import and_, case, func, literal, select
+from sqlalchemy.engine import Connection
+
+from models import OrderItem, Product, ProductSalesRollup
+
+logger = logging.getLogger(__name__)
+
+# Order item statuses that do not count as a sale
+EXCLUDED_STATUSES = ("Cancelled", "Returned")
+
+# Keep IN (...) lists to a reasonable size
+ID_BATCH_SIZE = 1000
+
+def _rollup_select(product_ids: Optional[Iterable[int]] = None):
+    """SELECT producing one rollup row per product with at least one order item"""
+    is_sale = OrderItem.status.notin_(EXCLUDED_STATUSES)
+    is_return = (OrderItem.status == "Returned") | OrderItem.returned_at.isnot(None)
+    query = (
+        select(
+            OrderItem.product_id,
+            func.max(Product.name),
+            func.sum(case((is_sale, 1), else_=0)),
+            func.coalesce(func.sum(case((is_sale, Product.retail_price), else_=0)), 0),
+            func.sum(case((is_return, 1), else_=0)),
+            literal(datetime.now()),
+        )
+        .select_from(OrderItem.__table__.join(Product.__table__, OrderItem.product_id == Product.id))
+        .group_by(OrderItem.product_id)
+    )
+    if product_ids is not None:
+        query = query.where(OrderItem.product_id.in_(list(product_ids)))
+    return query
+
+def refresh_sales_rollup(conn: Connection, product_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute the rollup for ``product_ids``, or rebuild it entirely when ``None``.
+
+    Runs inside the caller's transaction. Returns the number of products refreshed.
+    """
+    rollup = ProductSalesRollup.__table__
+    columns = ["product_id", "product_name", "units_sold", "revenue", "returned_units", "updated_at"]
+
+    if product_ids is None:
+        conn.execute(rollup.delete())
+        conn.execute(rollup.insert().from_select(columns, _rollup_select()))
+        count = conn.execute(select(func.count()).select_from(rollup)).scalar()
+        logger.info(f"Rebuilt sales rollup for {count} products")
+        return count
+
+    ids = sorted({int(i) for i in product_ids if i is not None})
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        conn.execute(rollup.delete().where(rollup.c.product_id.in_(batch)))
+        conn.execute(rollup.insert().from_select(columns, _rollup_select(batch)))
+    return len(ids)
+
+def affected_product_ids(conn: Connection, model, frame: pd.DataFrame) -> Set[int]:
+    """Products whose rollup rows change when ``frame`` is upserted into ``model``'s table.
+
+    Must be called before the upsert so that order items moving from one
+    product to another refresh both the old and the new product.
+    """
+    if model is Product:
+        return {int(i) for i in frame["id"].dropna()}
+    if model is not OrderItem or not len(frame):
+        return set()
+
+    ids = {int(i) for i in frame["product_id"].dropna()}
+    item_ids = frame["id"].dropna()
+    if len(item_ids):
+        existing = conn.execute(
+            select(OrderItem.product_id).distinct().where(
+                and_(OrderItem.id >= int(item_ids.min()), OrderItem.id <= int(item_ids.max()))
+            )
+        )
+        ids.update(row.product_id for row in existing if row.product_id is not None)
+    return ids
@@ -0,0 +1,213 @@
+"""
+Near-duplicate question cache.
+
+Exact-match caching (response_cache) misses paraphrases such as "what are
+your most popular products?" vs "what are the most popular products you
+have". This cache embeds each question locally as a sparse vector of hashed
+word stems and character trigrams, signs it with a 64-bit SimHash and indexes
+the signature in LSH bands (16 bands of 4 bits), so a lookup only compares
+against the few stored questions that share a band.
+
+An answer is only reused for the same model, intent and data fingerprint, and
+only when both questions have the same content words (stems left after stop
+words are dropped) and their cosine similarity reaches the configured
+threshold. Similarity alone is not enough: "least popular products" and "most
+popular products" score 0.79 but ask for opposite things. Everything runs
+in-process; no embedding API is involved.
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from response_cache import data_fingerprint, normalize_message, ttls_from_env
+
+SIGNATURE_BITS = 64
+BANDS = 16
+BAND_BITS = SIGNATURE_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Candidates from the LSH buckets whose exact similarity is computed per lookup
+MAX_CANDIDATES = 32
+
+WORD_WEIGHT = 2.0
+TRIGRAM_WEIGHT = 1.0
+
+STOP_WORDS = {
+    "a", "an", "and", "any", "are", "be", "can", "could", "do", "does", "for", "give", "has",
+    "have", "i", "in", "is", "it", "me", "of", "on", "our", "please", "show", "tell", "the",
+    "there", "to", "us", "we", "what", "whats", "which", "with", "you", "your",
+}
+
+_SUFFIX_RE = re.compile(r"(ing|ers|er|es|ed|s)$")
+
+def _stem(word: str) -> str:
+    return _SUFFIX_RE.sub("", word) if len(word) > 4 else word
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+def content_words(message: str) -> List[str]:
+    """Stems of the words of a question that are not stop words"""
+    return [_stem(w) for w in normalize_message(message).split() if w not in STOP_WORDS]
+
+def embed(message: str) -> Dict[int, float]:
+    """Sparse hashed feature vector of word stems and character trigrams, L2-normalized"""
+    features: Counter = Counter()
+    words = content_words(message)
+    for word in words:
+        features[_hash64("w:" + word)] += WORD_WEIGHT
+    joined = " ".join(words)
+    for i in range(len(joined) - 2):
+        features[_hash64("c:" + joined[i:i + 3])] += TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+def simhash(vector: Dict[int, float]) -> int:
+    """64-bit SimHash: each bit is the sign of the weighted vote of all features"""
+    votes = [0.0] * SIGNATURE_BITS
+    for feature, weight in vector.items():
+        for bit in range(SIGNATURE_BITS):
+            votes[bit] += weight if (feature >> bit) & 1 else -weight
+    signature = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            signature |= 1 << bit
+    return signature
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.85, max_entries: int = 2000,
+                 ttls: Optional[Dict[str, float]] = None, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # (namespace, band index, band value) -> entry ids
+        self._buckets: Dict[Tuple, set] = defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_seconds = 0.0
+        self.latency_saved_ms = 0.0
+        # Moving average of LLM latency, used to estimate what a hit saved
+        self.llm_latency_ms = 0.0
+
+    def _namespace(self, intent: str, data: Any, model: str) -> Optional[Tuple[str, str, str]]:
+        if not self.enabled or intent not in self.ttls:
+            return None
+        return (model, intent, data_fingerprint(data))
+
+    @staticmethod
+    def _bands(signature: int):
+        for band in range(BANDS):
+            yield band, (signature >> (band * BAND_BITS)) & BAND_MASK
+
+    def lookup(self, intent: str, data: Any, message: str, model: str) -> Optional[Dict[str, Any]]:
+        """Best cached answer for a near-duplicate question, with its similarity"""
+        namespace = self._namespace(intent, data, model)
+        if namespace is None:
+            return None
+        started = time.perf_counter()
+        words = frozenset(content_words(message))
+        vector = embed(message)
+        signature = simhash(vector)
+        now = time.monotonic()
+        best, best_score = None, 0.0
+        with self._lock:
+            self.lookups += 1
+            # Entries sharing more bands are more similar; only the best few are scored exactly
+            shared_bands: Counter = Counter()
+            for band, value in self._bands(signature):
+                shared_bands.update(self._buckets.get((namespace, band, value), ()))
+            for entry_id, _ in shared_bands.most_common(MAX_CANDIDATES):
+                entry = self._entries.get(entry_id)
+                if entry is None or entry["expires_at"] <= now or entry["words"] != words:
+                    continue
+                score = cosine(vector, entry["vector"])
+                if score > best_score:
+                    best, best_score = entry_id, score
+            if best is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best)
+                self.hits += 1
+                self.latency_saved_ms += self.llm_latency_ms
+                result = {"response": self._entries[best]["response"], "similarity": round(best_score, 4)}
+            else:
+                result = None
+            self.lookup_seconds += time.perf_counter() - started
+        return result
+
+    def store(self, intent: str, data: Any, message: str, model: str, response: str) -> None:
+        namespace = self._namespace(intent, data, model)
+        if namespace is None or not response:
+            return
+        vector = embed(message)
+        signature = simhash(vector)
+        words = frozenset(content_words(message))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "signature": signature,
+                "vector": vector,
+                "words": words,
+                "response": response,
+                "expires_at": time.monotonic() + self.ttls[intent],
+            }
+            for band, value in self._bands(signature):
+                self._buckets[(namespace, band, value)].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for band, value in self._bands(entry["signature"]):
+            key = (entry["namespace"], band, value)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def record_llm_latency(self, milliseconds: float) -> None:
+        """Feed the moving average used to estimate latency saved by hits"""
+        if self.llm_latency_ms:
+            self.llm_latency_ms = 0.9 * self.llm_latency_ms + 0.1 * milliseconds
+        else:
+            self.llm_latency_ms = milliseconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "avg_lookup_ms": round(self.lookup_seconds * 1000 / self.lookups, 3) if self.lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
+
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "2000")),
+    ttls=ttls_from_env(),
+    enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true",
+)
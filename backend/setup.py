@@ -88,7 +88,7 @@ def load_dataset():
     logger.info("Loading dataset into database...")
     try:
         from load_data import main as load_data_main
-        load_data_main()
+        load_data_main([])
         logger.info("Dataset loaded successfully")
         return True
     except Exception as e:
@@ -0,0 +1,181 @@
+"""
+Persistence of chat turns: direct, group-committed or write-behind.
+
+A chat turn stages its writes (a new user or conversation, its messages and
+the conversation counter increments) and hands them over in one piece. How
+they reach the database is set by ``CHAT_WRITE_MODE``:
+
+- ``sync`` (default): the turn commits its own transaction before responding.
+- ``group``: turns are queued and written together, one transaction every
+  ``GROUP_COMMIT_INTERVAL_MS`` (or every ``GROUP_COMMIT_MAX_BATCH`` turns).
+  Each request waits for the commit that includes it, so a turn is durable
+  once its response is sent, while concurrent turns share one commit.
+- ``async``: like ``group`` but requests that only add messages do not wait
+  (write-behind). Responses are faster, but a crash can lose the turns of
+  the last interval. Turns that create a user or conversation still wait,
+  so a follow-up request always finds them. The queue is drained on
+  shutdown.
+
+If a group commit fails, its turns are retried one transaction each so a
+single bad turn cannot take the others down with it.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Conversation
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODES = ("sync", "group", "async")
+
+# conversation id -> {"total", "user", "ai", "last_message_at"}
+CounterDeltas = Dict[str, Dict[str, Any]]
+
+def merge_counter_deltas(target: CounterDeltas, deltas: CounterDeltas) -> None:
+    for conversation_id, delta in deltas.items():
+        merged = target.setdefault(conversation_id, {"total": 0, "user": 0, "ai": 0, "last_message_at": None})
+        merged["total"] += delta["total"]
+        merged["user"] += delta["user"]
+        merged["ai"] += delta["ai"]
+        if merged["last_message_at"] is None or delta["last_message_at"] > merged["last_message_at"]:
+            merged["last_message_at"] = delta["last_message_at"]
+
+async def write_turns(db: AsyncSession, turns: List[Tuple[list, CounterDeltas]]) -> None:
+    """Insert the staged objects of ``turns`` and bump their counters in one transaction"""
+    deltas: CounterDeltas = {}
+    for objects, turn_deltas in turns:
+        db.add_all(objects)
+        merge_counter_deltas(deltas, turn_deltas)
+    # Inserts are ordered by foreign keys: users, then conversations, then messages
+    await db.flush()
+    for conversation_id, delta in deltas.items():
+        # Increment in the database so concurrent writers cannot lose an update
+        await db.execute(update(Conversation).where(Conversation.id == conversation_id).values(
+            total_messages=Conversation.total_messages + delta["total"],
+            user_messages=Conversation.user_messages + delta["user"],
+            ai_messages=Conversation.ai_messages + delta["ai"],
+            last_message_at=delta["last_message_at"],
+            updated_at=delta["last_message_at"]
+        ))
+    await db.commit()
+
+class GroupCommitQueue:
+    def __init__(self, mode: str = "sync", interval_ms: float = 5, max_batch: int = 200):
+        if mode not in WRITE_MODES:
+            logger.warning(f"Unknown chat write mode '{mode}'; using 'sync'")
+            mode = "sync"
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.batches = 0
+        self.failed_turns = 0
+        self.largest_batch = 0
+        self.commit_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "sync"
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop the writer"""
+        if self._task is None:
+            return
+        while not self._queue.empty():
+            await self._write(self._drain([]))
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, objects: list, deltas: CounterDeltas, wait: bool = False) -> None:
+        """Queue one turn's writes; in ``group`` mode, or with ``wait``, return once they are committed"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((objects, deltas, future))
+        if self.mode == "group" or wait:
+            await future
+
+    def _drain(self, batch: list) -> list:
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent turns one interval to join this commit
+            deadline = loop.time() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: list) -> None:
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await write_turns(db, [(objects, deltas) for objects, deltas, _ in batch])
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        except Exception as e:
+            logger.warning(f"Group commit of {len(batch)} turns failed ({e}); retrying them one by one")
+            for objects, deltas, future in batch:
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await write_turns(db, [(objects, deltas)])
+                    if not future.done():
+                        future.set_result(None)
+                except Exception as turn_error:
+                    self.failed_turns += 1
+                    logger.error(f"Could not persist chat turn: {turn_error}")
+                    if not future.done():
+                        future.set_exception(turn_error)
+                        # Write-behind turns have nobody awaiting the future
+                        future.exception()
+        self.turns += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.commit_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "turns": self.turns,
+            "batches": self.batches,
+            "avg_batch": round(self.turns / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "failed_turns": self.failed_turns,
+            "avg_commit_ms": round(self.commit_seconds * 1000 / self.batches, 2) if self.batches else 0.0,
+        }
+
+write_queue = GroupCommitQueue(
+    mode=os.getenv("CHAT_WRITE_MODE", "sync").lower(),
+    interval_ms=float(os.getenv("GROUP_COMMIT_INTERVAL_MS", "5")),
+    max_batch=int(os.getenv("GROUP_COMMIT_MAX_BATCH", "200")),
+)
@@ -72,7 +72,7 @@ function App() {
   const loadConversationMessages = async (convId: string) => {
     try {
       const response = await axios.get(`${API_BASE_URL}/api/conversations/${convId}/messages`)
-      const conversationMessages = response.data.map((msg: any) => ({
+      const conversationMessages = response.data.messages.map((msg: any) => ({
         id: msg.id,
         text: msg.content,
         isUser: msg.is_user_message,